@@ -0,0 +1,41 @@
+from functools import wraps
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils import timezone
+
+
+def _client_ip(request) -> str:
+    # Derrière le proxy Render, REMOTE_ADDR est celui du load balancer :
+    # la dernière entrée de X-Forwarded-For est celle ajoutée par le proxy.
+    forwarded = request.META.get("HTTP_X_FORWARDED_FOR", "")
+    if forwarded:
+        return forwarded.split(",")[-1].strip()
+    return request.META.get("REMOTE_ADDR", "")
+
+
+def rate_limit(key_prefix, limit, window=60, methods=("POST",)):
+    """
+    Limite le nombre de requêtes par IP sur une fenêtre de `window` secondes.
+    Compteur atomique en cache (add + incr) : une requête rejetée ne touche
+    ni la DB ni l'envoi d'e-mails. Répond 429 au-delà de `limit`.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            if request.method in methods:
+                bucket = int(timezone.now().timestamp()) // window
+                key = f"{key_prefix}:{_client_ip(request)}:{bucket}"
+                if cache.add(key, 1, window):
+                    count = 1
+                else:
+                    try:
+                        count = cache.incr(key)
+                    except ValueError:  # clé expirée entre add() et incr()
+                        cache.set(key, 1, window)
+                        count = 1
+                if count > limit:
+                    return HttpResponse("Too many requests. Please try again in a minute.", status=429)
+            return view_func(request, *args, **kwargs)
+        return _wrapped_view
+    return decorator
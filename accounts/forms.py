@@ -9,6 +9,14 @@ class CustomUserCreationForm(UserCreationForm):
         model = CustomUser
         fields = ("username", "email", "password1", "password2")
 
+    def clean_email(self):
+        # Normalisé ici (et non dans la vue) pour que le contrôle d'unicité
+        # porte sur la même valeur que celle enregistrée.
+        email = self.cleaned_data["email"].lower().strip()
+        if CustomUser.objects.filter(email__iexact=email).exists():
+            raise forms.ValidationError("Cet email est déjà utilisé.")
+        return email
+
 class UsernameAuthenticationForm(AuthenticationForm):
     username = forms.CharField(label="Nom d'utilisateur", max_length=150)
 
@@ -1,12 +1,27 @@
 from datetime import timedelta
+from types import MappingProxyType
 
 from django.conf import settings
 from django.contrib.auth.models import AbstractUser, Group, Permission
-from django.db import models, transaction
+from django.db import connection, models
 from django.db.models import F
 from django.utils import timezone
 
 
+# Quotas mensuels par abonnement : (secondes audio, caractères texte)
+_QUOTAS = MappingProxyType({
+    "free":    (3 * 3600,  50_000),
+    "student": (10 * 3600, 200_000),
+    "pro":     (20 * 3600, 500_000),
+    "team":    (40 * 3600, 1_000_000),
+})
+
+
+def _supports_update_returning() -> bool:
+    # PostgreSQL, et SQLite >= 3.35 (même version que RETURNING sur INSERT).
+    return connection.vendor in ("postgresql", "sqlite") and connection.features.can_return_columns_from_insert
+
+
 class CustomUser(AbstractUser):
     email = models.EmailField(unique=True)
 
@@ -41,20 +56,27 @@ class CustomUser(AbstractUser):
         Réinitialise les crédits 1 fois / ~30 jours en fonction de l'abonnement.
         """
         now = timezone.now()
-        if self.last_audio_reset and (now - self.last_audio_reset) < timedelta(days=30):
+        cutoff = now - timedelta(days=30)
+        if self.last_audio_reset and self.last_audio_reset > cutoff:
             return
 
-        quotas = {
-            "free":    {"audio_s": 3 * 3600,  "text_ch": 50_000},
-            "student": {"audio_s": 10 * 3600, "text_ch": 200_000},
-            "pro":     {"audio_s": 20 * 3600, "text_ch": 500_000},
-            "team":    {"audio_s": 40 * 3600, "text_ch": 1_000_000},
-        }
-        q = quotas.get(self.subscription, quotas["free"])
-        self.audio_credits_s = q["audio_s"]
-        self.text_credits_ch = q["text_ch"]
+        audio_s, text_ch = _QUOTAS.get(self.subscription, _QUOTAS["free"])
+        # UPDATE conditionnel (même pattern anti-race que les débits), sans save()
+        updated = (
+            self.__class__
+            .objects
+            .filter(pk=self.pk, last_audio_reset__lte=cutoff)
+            .update(
+                audio_credits_s=audio_s,
+                text_credits_ch=text_ch,
+                last_audio_reset=now,
+            )
+        )
+        if not updated:
+            return
+        self.audio_credits_s = audio_s
+        self.text_credits_ch = text_ch
         self.last_audio_reset = now
-        self.save(update_fields=["audio_credits_s", "text_credits_ch", "last_audio_reset"])
 
     # --------------------------
     # Helpers de vérification
@@ -75,38 +97,52 @@ class CustomUser(AbstractUser):
 
     # --------------------------
     # Débits atomiques anti-race
+    # (un seul UPDATE conditionnel : pas besoin de BEGIN/COMMIT autour)
     # --------------------------
-    @transaction.atomic
+    def _debit_returning(self, field: str, amount: int):
+        """
+        UPDATE ... WHERE field >= amount RETURNING field : un seul aller-retour DB.
+        Renvoie le nouveau solde, ou None si crédits insuffisants.
+        MySQL/MariaDB n'ont pas d'UPDATE ... RETURNING : UPDATE conditionnel
+        via l'ORM puis relecture du solde.
+        """
+        if not _supports_update_returning():
+            qs = self.__class__.objects.filter(pk=self.pk)
+            updated = qs.filter(**{f"{field}__gte": amount}).update(**{field: F(field) - amount})
+            if not updated:
+                return None
+            return qs.values_list(field, flat=True).get()
+        qn = connection.ops.quote_name
+        col = qn(self._meta.get_field(field).column)
+        sql = (
+            f"UPDATE {qn(self._meta.db_table)} SET {col} = {col} - %s "
+            f"WHERE {qn(self._meta.pk.column)} = %s AND {col} >= %s "
+            f"RETURNING {col}"
+        )
+        with connection.cursor() as c:
+            c.execute(sql, [amount, self.pk, amount])
+            row = c.fetchone()
+        return row[0] if row else None
+
     def debit_audio(self, seconds: int) -> bool:
         seconds = max(0, int(seconds or 0))
         if seconds == 0:
             return True
-        updated = (
-            self.__class__
-            .objects
-            .filter(pk=self.pk, audio_credits_s__gte=seconds)
-            .update(audio_credits_s=F("audio_credits_s") - seconds)
-        )
-        if updated:
-            self.refresh_from_db(fields=["audio_credits_s"])
-            return True
-        return False
+        remaining = self._debit_returning("audio_credits_s", seconds)
+        if remaining is None:
+            return False
+        self.audio_credits_s = remaining
+        return True
 
-    @transaction.atomic
     def debit_text(self, chars: int) -> bool:
         chars = max(0, int(chars or 0))
         if chars == 0:
             return True
-        updated = (
-            self.__class__
-            .objects
-            .filter(pk=self.pk, text_credits_ch__gte=chars)
-            .update(text_credits_ch=F("text_credits_ch") - chars)
-        )
-        if updated:
-            self.refresh_from_db(fields=["text_credits_ch"])
-            return True
-        return False
+        remaining = self._debit_returning("text_credits_ch", chars)
+        if remaining is None:
+            return False
+        self.text_credits_ch = remaining
+        return True
 
     # --------------------------
     # Infos d'abonnement (optionnel)
@@ -115,6 +151,11 @@ class CustomUser(AbstractUser):
     def current_subscription(self) -> str:
         return self.subscription
 
+    @property
+    def audio_quota_s(self) -> int:
+        """Quota audio mensuel (secondes) du plan courant."""
+        return _QUOTAS.get(self.subscription, _QUOTAS["free"])[0]
+
     @property
     def is_subscribed(self) -> bool:
         return self.subscription != "free"
@@ -0,0 +1,13 @@
+from allauth.account.signals import email_confirmed
+from django.core.cache import cache
+from django.dispatch import receiver
+
+
+def email_verified_cache_key(user_id) -> str:
+    """Clé du cache « email vérifié » lue au login."""
+    return f"email_verified:{user_id}"
+
+
+@receiver(email_confirmed)
+def invalidate_email_verified(sender, request, email_address, **kwargs):
+    cache.delete(email_verified_cache_key(email_address.user_id))
@@ -1,3 +1,45 @@
+from django.contrib.auth import get_user_model
 from django.test import TestCase
 
-# Create your tests here.
+from .forms import CustomUserCreationForm
+
+User = get_user_model()
+
+
+class DebitTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("alice", "alice@example.com", "s3cret-pass!", audio_credits_s=10)
+
+    def test_insufficient_credits_leave_balance_untouched(self):
+        self.assertFalse(self.user.debit_audio(20))
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.audio_credits_s, 10)
+
+    def test_debit_returns_new_balance(self):
+        self.assertTrue(self.user.debit_audio(4))
+        self.assertEqual(self.user.audio_credits_s, 6)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.audio_credits_s, 6)
+
+
+class SignupFormTests(TestCase):
+    def test_case_variant_email_is_rejected(self):
+        User.objects.create_user("alice", "foo@example.com", "s3cret-pass!")
+        form = CustomUserCreationForm(data={
+            "username": "bob",
+            "email": "Foo@Example.com",
+            "password1": "An0ther-pass!",
+            "password2": "An0ther-pass!",
+        })
+        self.assertFalse(form.is_valid())
+        self.assertIn("email", form.errors)
+
+    def test_email_is_lowercased(self):
+        form = CustomUserCreationForm(data={
+            "username": "bob",
+            "email": "Bob@Example.com",
+            "password1": "An0ther-pass!",
+            "password2": "An0ther-pass!",
+        })
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.cleaned_data["email"], "bob@example.com")
@@ -3,7 +3,6 @@ from django.contrib.auth.views import LoginView
 from .forms import CustomUserCreationForm, UsernameAuthenticationForm
 from django.contrib.auth import login as auth_login, authenticate
 from django.contrib.auth.decorators import login_required
-from django.contrib.auth import login as auth_login, authenticate
 from django.contrib.auth import logout
 from courses.models import Course 
 from django.urls import reverse_lazy
@@ -14,10 +13,18 @@ import stripe
 from subscriptions.models import Subscription
 from allauth.account.adapter import get_adapter
 from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.core.paginator import Paginator
+from courses.signals import user_courses_cache_key
+from .signals import email_verified_cache_key
+from .decorators import rate_limit
 # add this import (and remove the broken one)
 from allauth.account.models import EmailAddress
 
+COURSES_PER_PAGE = 20
 
+@rate_limit("signup_rl", limit=5, window=60)
 def signup(request):
     if request.method == 'POST':
         form = CustomUserCreationForm(request.POST)
@@ -29,16 +36,21 @@ def signup(request):
                 user.username = get_adapter().generate_unique_username([user.email])
 
             user.is_active = True  # allauth will still block login until email is verified
-            user.save()
 
-            # ✅ Create EmailAddress and send confirmation in one go
-            EmailAddress.objects.add_email(
-                request,
-                user,
-                user.email,
-                confirm=True,   # sends the verification email
-                signup=True,    # marks flow as signup for templates/logic
-            )
+            # ✅ User + EmailAddress in one transaction (no allauth add_email lookups)
+            with transaction.atomic():
+                user.save()
+                email_address = EmailAddress.objects.create(
+                    user=user,
+                    email=user.email,
+                    primary=True,
+                    verified=False,
+                )
+                # Envoi SMTP après le commit : pas de transaction ouverte pendant
+                # l'envoi, ni de mail pour un compte annulé par un rollback.
+                transaction.on_commit(
+                    lambda: email_address.send_confirmation(request, signup=True)
+                )
 
             messages.success(
                 request,
@@ -56,7 +68,11 @@ class CustomLoginView(LoginView):
 
     def form_valid(self, form):
         user = form.get_user()
-        email_verified = EmailAddress.objects.filter(user=user, verified=True).exists()
+        verified_key = email_verified_cache_key(user.pk)
+        email_verified = cache.get(verified_key)
+        if email_verified is None:
+            email_verified = EmailAddress.objects.filter(user=user, verified=True).exists()
+            cache.set(verified_key, email_verified, 300)
         if not email_verified:
             messages.error(self.request, "Please verify your email before logging in.")
             return redirect('login')
@@ -66,8 +82,10 @@ def logout_view(request):
     if request.method == 'POST':
         logout(request)
         return redirect('login')
-def home(request) : 
-    return render(request,'home.html')
+def home(request):
+    # Pas de cache_page ici : home.html embarque {% csrf_token %} et le JS lit
+    # le cookie csrftoken, qu'une réponse mise en cache ne poserait plus.
+    return render(request, 'home.html')
 
 def roadmap(request):
     return render(request, 'roadmap.html')
@@ -76,28 +94,42 @@ def roadmap(request):
 def account_page(request):
     user = request.user
 
-    # Réinitialiser les crédits si nécessaire
-    user.reset_monthly_credits()
+    # Réinitialiser les crédits si nécessaire (vérifié au plus 1x / heure / user)
+    reset_key = f"reset_checked:{user.pk}"
+    if not cache.get(reset_key):
+        user.reset_monthly_credits()
+        cache.set(reset_key, 1, 3600)
 
-    # Obtenir le quota total en fonction de l'abonnement
-    quotas = {
-        'free': 3 * 3600,  # 3 heures en secondes
-        'student': 10 * 3600,  # 10 heures en secondes
-        'pro': 20 * 3600,  # 20 heures en secondes
-    }
-    quota = quotas.get(user.subscription, quotas['free'])
+    # Obtenir le quota total en fonction de l'abonnement (table partagée du modèle)
+    quota = user.audio_quota_s
 
     # Calculer les crédits restants
     remaining_seconds = user.audio_credits_s
     remaining_hours = int(remaining_seconds // 3600)
     remaining_minutes = int((remaining_seconds % 3600) // 60)
 
-    # Récupérer les cours de l'utilisateur
-    courses = Course.objects.filter(user=user).order_by('-created_at')
+    # Récupérer les cours de l'utilisateur (uniquement les colonnes affichées)
+    courses_qs = (
+        Course.objects
+        .filter(user=user)
+        .only("id", "title", "description", "processing", "created_at")
+        .order_by("-created_at")
+    )
+    page_obj = Paginator(courses_qs, COURSES_PER_PAGE).get_page(request.GET.get("page"))
+    if page_obj.number == 1:
+        # 1re page en cache, invalidée par les signaux save/delete de Course
+        courses_key = user_courses_cache_key(user.pk)
+        courses = cache.get(courses_key)
+        if courses is None:
+            courses = list(page_obj.object_list)
+            cache.set(courses_key, courses, 600)
+    else:
+        courses = page_obj.object_list
 
     return render(request, 'account.html', {
         'user': user,
         'courses': courses,
+        'page_obj': page_obj,
         'remaining_hours': remaining_hours,
         'remaining_minutes': remaining_minutes,
         'quota': quota,
@@ -177,16 +209,22 @@ def cancel_subscription(request):
 
     user = request.user
 
-    # 1) récupérer l'abonnement actif dans ta DB
-    db_sub = Subscription.objects.filter(user=user, canceled_at__isnull=True).order_by("-start_date").first()
-    if not db_sub:
+    # 1) récupérer l'abonnement actif dans ta DB (seul l'id Stripe est utile : pas d'instance)
+    sub_id = (
+        Subscription.objects
+        .filter(user_id=user.id, canceled_at__isnull=True)
+        .order_by("-start_date")
+        .values_list("subscription_id", flat=True)
+        .first()
+    )
+    if not sub_id:
         messages.error(request, "Aucun abonnement actif trouvé.")
         return redirect("settings")
 
     # 2) annuler côté Stripe à la fin de la période en cours
     try:
         stripe.Subscription.modify(
-            db_sub.subscription_id,
+            sub_id,
             cancel_at_period_end=True,
         )
     except stripe.error.InvalidRequestError as e:
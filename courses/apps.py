@@ -4,3 +4,26 @@ from django.apps import AppConfig
 class CoursesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'courses'
+
+    def ready(self):
+        from . import signals  # noqa: F401  (branche les receivers)
+        self._warm_up()
+
+    @staticmethod
+    def _warm_up():
+        """
+        Paie au démarrage (master Gunicorn avec --preload) les initialisations
+        coûteuses au lieu de la première requête de chaque worker :
+        encodeur tiktoken (construit à l'import de logic), parseur Markdown,
+        sanitizer nh3 et table filetype.
+        """
+        try:
+            from . import logic  # noqa: F401
+            from .utils.sanitize import md_to_safe_html
+            import filetype
+
+            md_to_safe_html("# warmup")
+            filetype.guess(b"\x00" * 16)
+        except Exception:
+            # Jamais bloquant : au pire, le coût revient à la première requête
+            pass
@@ -0,0 +1,41 @@
+"""
+Cache des réponses LLM, au-dessus de django.core.cache (Redis en prod).
+
+La clé est le SHA-256 de la requête complète (modèle, messages, température,
+options) : deux requêtes identiques, même issues de cours différents,
+partagent la même entrée.
+
+Seuls les appels déterministes (température 0) passent par ce cache : les
+résumés de chunks et la réduction en plan. Relancer un cours sur la même
+transcription saute donc toute l'étape map/reduce ; cours, QCM et exercices
+restent échantillonnés et sont toujours régénérés.
+"""
+import hashlib
+import json
+
+from django.core.cache import cache
+
+DEFAULT_TTL = 7 * 86400
+
+
+def make_key(model: str, messages, temperature: float, **extra) -> str:
+    payload = json.dumps(
+        {"model": model, "msg": messages, "t": temperature, **extra},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return "llm:" + hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def get(key: str):
+    try:
+        return cache.get(key)
+    except Exception:  # CLI sans settings Django, ou backend de cache indisponible
+        return None
+
+
+def set(key: str, value, ttl: int = DEFAULT_TTL) -> None:
+    try:
+        cache.set(key, value, ttl)
+    except Exception:
+        pass
@@ -6,8 +6,8 @@ OMYA Pipeline (single file)
 - Robust chunking, retries, and clean CLI
 
 Requirements:
-  pip install openai python-dotenv pydub tiktoken (optional)
-  ffmpeg installed for pydub
+  pip install openai python-dotenv tenacity tiktoken (optional)
+  ffmpeg + ffprobe installed (or FFMPEG_BIN / FFPROBE_BIN)
 Env:
   OPENAI_API_KEY=...
 
@@ -17,27 +17,39 @@ Cleanup:
 
 import os
 import re
+import asyncio
 import sys
 import math
-import json
-import time
 import glob
+import json
+import zlib
+import hashlib
+import subprocess
 import argparse
-from typing import List, Dict, Optional
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator, List, Dict, Optional, Tuple, Union
 from dataclasses import dataclass
 from pathlib import Path  # <<< NEW
 
 from dotenv import load_dotenv
-from pydub import AudioSegment
 
 try:
     import tiktoken  # optional; used if available
+    _ENC = tiktoken.get_encoding("cl100k_base")  # built once, reused by estimate_tokens
 except Exception:
     tiktoken = None
+    _ENC = None
 
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI, APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_random_exponential
 from celery import shared_task  # (import présent si tu l'utilises ailleurs)
 
+try:
+    from . import llm_cache
+except ImportError:  # run as a script (python courses/logic.py)
+    import llm_cache
+
 load_dotenv()
 client = OpenAI()
 
@@ -50,16 +62,34 @@ QCM_MODEL = os.getenv("OMYA_QCM_MODEL", "gpt-4o")
 EXO_MODEL = os.getenv("OMYA_EXO_MODEL", "gpt-4o")
 TRANSCRIBE_MODEL = os.getenv("OMYA_TRANSCRIBE_MODEL", "whisper-1")  # or gpt-4o-transcribe
 
+FFMPEG_BIN = os.getenv("FFMPEG_BIN", "ffmpeg")
+FFPROBE_BIN = os.getenv("FFPROBE_BIN", "ffprobe")
+
 MAX_AUDIO_MB = int(os.getenv("OMYA_MAX_AUDIO_MB", "24"))
-SENTENCES_PER_CHUNK = int(os.getenv("OMYA_SENTENCES_PER_CHUNK", "12"))
+SENTENCES_PER_CHUNK = int(os.getenv("OMYA_SENTENCES_PER_CHUNK", "12"))  # average; boundaries are content-defined
 TARGET_TOKENS_PER_CHUNK = int(os.getenv("OMYA_TOKENS_PER_CHUNK", "900"))  # used if tiktoken available
 
+SUMMARY_CONCURRENCY = int(os.getenv("OMYA_SUMMARY_CONCURRENCY", "8"))  # max in-flight map-step requests
+# Chunks packed into one map-step request. Kept small on purpose: output tokens
+# are generated serially, so big packs trade latency for fewer requests.
+SUMMARY_BATCH_SIZE = max(1, int(os.getenv("OMYA_SUMMARY_BATCH_SIZE", "4")))
+TRANSCRIBE_WORKERS = int(os.getenv("OMYA_TRANSCRIBE_WORKERS", "4"))  # parallel Whisper uploads (OpenAI RPM limits)
+
 MAX_RETRIES = 4
-RETRY_BACKOFF = 2.0
+RETRY_MAX_WAIT_S = 30
+
+LLM_CACHE_TTL = int(os.getenv("OMYA_LLM_CACHE_TTL", str(7 * 86400)))  # seconds; 0 disables
+# Map (chunk summaries) and reduce (outline) are extraction steps: run them
+# deterministically so _chat/_achat can serve repeats from the LLM cache.
+# Course/QCM/exercises keep sampling and always hit the API.
+SUMMARY_TEMPERATURE = 0.0
 
 # Cleanup behavior (delete original file too?)
 DELETE_ORIGINAL_AUDIO = os.getenv("OMYA_DELETE_ORIGINAL_AUDIO", "1") == "1"
 
+_SENT_RE = re.compile(r"(?<=[.!?])\s+")
+_WIN_PATH_RE = re.compile(r"^[A-Za-z]:\\")
+
 
 @dataclass
 class PipelineOutputs:
@@ -71,17 +101,63 @@ class PipelineOutputs:
     exercises: str
 
 
-def _retry(fn, *args, **kwargs):
-    """Exponential backoff retry wrapper for API calls."""
-    for attempt in range(1, MAX_RETRIES + 1):
-        try:
-            return fn(*args, **kwargs)
-        except Exception as e:
-            if attempt == MAX_RETRIES:
-                raise
-            sleep_s = RETRY_BACKOFF ** attempt
-            print(f"⚠️ API error: {e}. Retry {attempt}/{MAX_RETRIES-1} in {sleep_s:.1f}s...", file=sys.stderr)
-            time.sleep(sleep_s)
+def _log_retry(state) -> None:
+    err = state.outcome.exception()
+    print(f"⚠️ API error: {err}. Retry {state.attempt_number}/{MAX_RETRIES-1} "
+          f"in {state.next_action.sleep:.1f}s...", file=sys.stderr)
+
+
+# Jittered exponential backoff on transient OpenAI errors only: concurrent
+# workers no longer retry in lockstep, and 4xx errors fail fast.
+api_retry = retry(
+    wait=wait_random_exponential(multiplier=1, max=RETRY_MAX_WAIT_S),
+    stop=stop_after_attempt(MAX_RETRIES),
+    retry=retry_if_exception_type((RateLimitError, APIConnectionError, APITimeoutError, InternalServerError)),
+    before_sleep=_log_retry,
+    reraise=True,
+)
+
+
+@api_retry
+def _complete(**params) -> str:
+    resp = client.chat.completions.create(**params)
+    return resp.choices[0].message.content.strip()
+
+
+@api_retry
+async def _acomplete(aclient: AsyncOpenAI, **params) -> str:
+    resp = await aclient.chat.completions.create(**params)
+    return resp.choices[0].message.content.strip()
+
+
+def _chat(model: str, temperature: float, messages: List[Dict[str, str]], **extra) -> str:
+    """
+    Chat completion through the LLM cache: identical requests (model, messages,
+    temperature, options) are answered from the cache instead of the API.
+    Only deterministic calls (temperature 0) are cached; sampled ones always hit the API.
+    """
+    if not LLM_CACHE_TTL or temperature != 0:
+        return _complete(model=model, temperature=temperature, messages=messages, **extra)
+    key = llm_cache.make_key(model, messages, temperature, **extra)
+    cached = llm_cache.get(key)
+    if cached is not None:
+        return cached
+    out = _complete(model=model, temperature=temperature, messages=messages, **extra)
+    llm_cache.set(key, out, LLM_CACHE_TTL)
+    return out
+
+
+async def _achat(aclient: AsyncOpenAI, model: str, temperature: float, messages: List[Dict[str, str]], **extra) -> str:
+    """Async twin of _chat; shares its cache entries."""
+    if not LLM_CACHE_TTL or temperature != 0:
+        return await _acomplete(aclient, model=model, temperature=temperature, messages=messages, **extra)
+    key = llm_cache.make_key(model, messages, temperature, **extra)
+    cached = llm_cache.get(key)
+    if cached is not None:
+        return cached
+    out = await _acomplete(aclient, model=model, temperature=temperature, messages=messages, **extra)
+    llm_cache.set(key, out, LLM_CACHE_TTL)
+    return out
 
 
 # =====================
@@ -93,16 +169,13 @@ def to_wsl_path(p: Optional[str]) -> Optional[str]:
     Convertit un chemin absolu Windows (ex: C:\\Users\\...) en chemin WSL (/mnt/c/Users/...)
     Laisse inchangé si déjà POSIX ou si None.
     """
-    if p is None:
-        return None
-    # déjà POSIX ?
-    if p.startswith("/"):
+    # déjà POSIX (cas courant) ? pas besoin du regex
+    if p is None or len(p) < 3 or p[1] != ":":
         return p
     # Windows absolu ?
-    if re.match(r"^[A-Za-z]:\\", p):
+    if _WIN_PATH_RE.match(p):
         drive = p[0].lower()
-        p2 = p.replace("\\", "/")
-        return f"/mnt/{drive}/{p2[3:]}"
+        return f"/mnt/{drive}/" + p[3:].replace("\\", "/")
     return p
 
 
@@ -125,8 +198,15 @@ def cleanup_audio_files(original_path: Optional[str], part_paths: Optional[List[
             _safe_rm(p)
     # also sweep any stray *_part*.mp3 next to original (extra safety)
     if original_path:
-        for p in glob.glob(f"{original_path}_part*.mp3"):
-            _safe_rm(p)
+        parent = os.path.dirname(original_path) or "."
+        prefix = os.path.basename(original_path) + "_part"
+        try:
+            with os.scandir(parent) as it:
+                for entry in it:
+                    if entry.name.startswith(prefix) and entry.name.endswith(".mp3"):
+                        _safe_rm(entry.path)
+        except OSError:
+            pass
         if DELETE_ORIGINAL_AUDIO:
             _safe_rm(original_path)
 
@@ -135,6 +215,15 @@ def cleanup_audio_files(original_path: Optional[str], part_paths: Optional[List[
 # 1) Audio splitting by size
 # =====================
 
+def probe_duration_seconds(file_path: str) -> float:
+    """Container duration via ffprobe (reads headers only, never decodes to PCM)."""
+    out = subprocess.run(
+        [FFPROBE_BIN, "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", file_path],
+        capture_output=True, text=True, check=True, timeout=30,
+    )
+    return float(out.stdout.strip())
+
+
 def split_audio_by_size(file_path: str, max_mb: int = MAX_AUDIO_MB) -> List[str]:
     # Normalize path for WSL if coming from Windows
     file_path = to_wsl_path(file_path)  # <<< NEW
@@ -144,37 +233,31 @@ def split_audio_by_size(file_path: str, max_mb: int = MAX_AUDIO_MB) -> List[str]
 
     file_size_bytes = os.path.getsize(file_path)
     max_bytes = max_mb * 1024 * 1024
-    audio = AudioSegment.from_file(file_path)
-
-    if file_size_bytes <= max_bytes:
-        out = f"{file_path}_part0.mp3"
-        audio.export(out, format="mp3")
+    num_parts = max(1, math.ceil(file_size_bytes / max_bytes))
+    if num_parts == 1:
         print("✅ Audio en 1 partie (pas de découpage)")
-        return [out]
-
-    num_parts = math.ceil(file_size_bytes / max_bytes)
-    print(f"⚙️ Fichier {round(file_size_bytes / (1024*1024), 2)} Mo → découpe en {num_parts} parties…")
-    part_duration_ms = len(audio) // num_parts
-
-    chunks = []
-    start = 0
-    while start < len(audio):
-        end = min(start + part_duration_ms, len(audio))
-        chunk = audio[start:end]
-        chunks.append(chunk)
-        start = end
-
-    # Merge tiny tail if < 10 seconds into previous chunk
-    if len(chunks) > 1 and len(chunks[-1]) < 10_000:
-        print("⏩ Dernière partie fusionnée (trop courte)")
-        chunks[-2] = chunks[-2] + chunks[-1]
-        chunks = chunks[:-1]
+    else:
+        print(f"⚙️ Fichier {round(file_size_bytes / (1024*1024), 2)} Mo → découpe en {num_parts} parties…")
+
+    # Leftover parts from an earlier/crashed run would be picked up below: clear them first.
+    src = Path(file_path)
+    for stale in src.parent.glob(f"{glob.escape(src.name)}_part*.mp3"):
+        _safe_rm(str(stale))
+
+    # Time-based segmentation streamed by ffmpeg: constant memory, no PCM round-trip.
+    # MP3 input is stream-copied; other formats are re-encoded to MP3 on the fly.
+    part_duration_s = max(1, math.ceil(probe_duration_seconds(file_path) / num_parts))
+    codec = ["-c", "copy"] if file_path.lower().endswith(".mp3") else ["-c:a", "libmp3lame", "-q:a", "4"]
+    subprocess.run(
+        [FFMPEG_BIN, "-v", "error", "-y", "-i", file_path, "-vn",
+         "-f", "segment", "-segment_time", str(part_duration_s), "-reset_timestamps", "1",
+         *codec, f"{file_path}_part%d.mp3"],
+        check=True,
+    )
 
     out_paths = []
-    for i, ch in enumerate(chunks):
-        out = f"{file_path}_part{i}.mp3"
-        ch.export(out, format="mp3")
-        out_paths.append(out)
+    while os.path.exists(f"{file_path}_part{len(out_paths)}.mp3"):
+        out_paths.append(f"{file_path}_part{len(out_paths)}.mp3")
     return out_paths
 
 
@@ -182,11 +265,11 @@ def split_audio_by_size(file_path: str, max_mb: int = MAX_AUDIO_MB) -> List[str]
 # 2) Transcription
 # =====================
 
+@api_retry
 def transcribe_audio(file_path: str, model: str = TRANSCRIBE_MODEL) -> str:
     file_path = to_wsl_path(file_path)  # <<< NEW (safety)
     with open(file_path, "rb") as f:
-        tr = _retry(
-            client.audio.transcriptions.create,
+        tr = client.audio.transcriptions.create(
             model=model,
             file=f,
             response_format="text",
@@ -194,42 +277,87 @@ def transcribe_audio(file_path: str, model: str = TRANSCRIBE_MODEL) -> str:
     return tr
 
 
+@api_retry
+async def atranscribe_audio(file_path: str, model: str = TRANSCRIBE_MODEL, *, aclient: AsyncOpenAI) -> str:
+    """Async twin of transcribe_audio: parts of one upload are sent concurrently."""
+    file_path = to_wsl_path(file_path)
+    with open(file_path, "rb") as f:
+        return await aclient.audio.transcriptions.create(
+            model=model,
+            file=f,
+            response_format="text",
+        )
+
+
 # =====================
 # 3) Chunking utilities (sentences / tokens)
 # =====================
 
 def sentence_split(text: str) -> List[str]:
     # Naive but effective sentence split (keeps punctuation)
-    chunks = re.split(r"(?<=[.!?])\s+", text.strip())
+    chunks = _SENT_RE.split(text.strip())
     return [c for c in chunks if c]
 
 
+def _iter_sentences(segments: Iterable[str]) -> Iterator[str]:
+    """
+    Sentences of "\n".join(segments), without building the joined string.
+    The last sentence of a segment is held back: it may continue in the next one.
+    """
+    carry = ""
+    for seg in segments:
+        sents = sentence_split(f"{carry}\n{seg}" if carry else seg)
+        if not sents:
+            continue
+        *done, carry = sents
+        yield from done
+    if carry:
+        yield carry
+
+
 def estimate_tokens(text: str) -> int:
-    if tiktoken is None:
+    if _ENC is None:
         # rough estimate: 1 token ≈ 4 chars in English; FR similar order
         return max(1, len(text) // 4)
-    enc = tiktoken.get_encoding("cl100k_base")
-    return len(enc.encode(text))
+    return len(_ENC.encode(text))
 
 
-def chunk_text(text: str,
+def _is_boundary(sentence: str, period: int) -> bool:
+    # Content-defined cut point: depends only on the sentence itself, so an
+    # edit upstream does not shift the boundaries downstream, and the other
+    # chunks keep their per-chunk summary cache keys (asummarize_chunks_batch).
+    return zlib.crc32(sentence.encode("utf-8")) % period == 0
+
+
+def chunk_text(text: Union[str, Iterable[str]],
                sentences_per_chunk: int = SENTENCES_PER_CHUNK,
                target_tokens: int = TARGET_TOKENS_PER_CHUNK) -> List[str]:
-    sents = sentence_split(text)
+    """
+    Content-defined chunking: a chunk ends after a sentence whose hash hits
+    the boundary condition (on average every `sentences_per_chunk` sentences),
+    once it holds at least target_tokens/4 tokens. `target_tokens` is a hard cap.
+    `text` may also be an iterable of segments (e.g. transcription parts),
+    chunked as if joined with newlines.
+    """
+    sents = sentence_split(text) if isinstance(text, str) else _iter_sentences(text)
+    period = max(1, sentences_per_chunk)
+    min_tokens = target_tokens // 4
     chunks: List[str] = []
     buf: List[str] = []
     buf_tokens = 0
 
     for s in sents:
-        candidate = (" ".join(buf + [s])).strip()
-        toks = estimate_tokens(candidate)
-        if buf and (toks > target_tokens or len(buf) >= sentences_per_chunk):
+        # Tokens counted once per sentence; the buffer total is a running sum
+        # (no re-encoding of the growing buffer → O(N) instead of O(N²)).
+        toks = estimate_tokens(s)
+        if buf and buf_tokens + toks > target_tokens:
             chunks.append(" ".join(buf).strip())
-            buf = [s]
-            buf_tokens = estimate_tokens(s)
-        else:
-            buf.append(s)
-            buf_tokens = toks
+            buf, buf_tokens = [], 0
+        buf.append(s)
+        buf_tokens += toks
+        if buf_tokens >= min_tokens and _is_boundary(s, period):
+            chunks.append(" ".join(buf).strip())
+            buf, buf_tokens = [], 0
 
     if buf:
         chunks.append(" ".join(buf).strip())
@@ -240,53 +368,186 @@ def chunk_text(text: str,
 # 4) LLM helpers
 # =====================
 
+_LANG_LABELS = {
+    "fr": "French",
+    "en": "English",
+    "es": "Spanish",
+    "de": "German",
+    "it": "Italian",
+}
+
+
+@functools.lru_cache(maxsize=16)
 def _lang_label(language: str) -> str:
-    mapping = {
-        "fr": "French",
-        "en": "English",
-        "es": "Spanish",
-        "de": "German",
-        "it": "Italian",
-    }
-    return mapping.get(language, "French")
+    return _LANG_LABELS.get(language, "French")
+
+
+# Static system prompts, rendered once per (kind, language) by _system_prompt
+_SYSTEM_PROMPTS = {
+    "sum": "You are a precise academic summarizer. Output bullet points only. Always respond in {lang}.",
+    "sum_batch": "You are a precise academic summarizer. Output only the requested JSON object; each summary is bullet points. Always respond in {lang}.",
+    "reduce": "You merge overlapping bullets into a coherent high-level outline. Always respond in {lang}.",
+    "course": "You are a university-level course writer. Output Markdown only. Always respond in {lang}.",
+    "qcm": "You are a rigorous examiner. Output Markdown only. Always respond in {lang}.",
+    "exo": "You are a university professor. Output Markdown only. Always respond in {lang}.",
+}
+
+
+@functools.lru_cache(maxsize=64)
+def _system_prompt(kind: str, language: str) -> str:
+    return _SYSTEM_PROMPTS[kind].format(lang=_lang_label(language))
+
+
+def _summary_messages(chunk: str, language: str) -> List[Dict[str, str]]:
+    return [
+        {"role": "system", "content": _system_prompt("sum", language)},
+        {"role": "user", "content": f"Summarize the following in 5-10 concise bullet points. Respond in {_lang_label(language)}.\n\n{chunk}"},
+    ]
+
+
+def _summary_cache_key(chunk: str, language: str) -> str:
+    return llm_cache.make_key(SUMMARY_MODEL, _summary_messages(chunk, language), SUMMARY_TEMPERATURE)
 
 
 def summarize_chunk(chunk: str, language: str = "fr") -> str:
-    resp = _retry(
-        client.chat.completions.create,
-        model=SUMMARY_MODEL,
-        temperature=0.2,
-        messages=[
-            {"role": "system", "content": f"You are a precise academic summarizer. Output bullet points only. Always respond in {_lang_label(language)}."},
-            {"role": "user", "content": f"Summarize the following in 5-10 concise bullet points. Respond in {_lang_label(language)}.\n\n{chunk}"},
-        ],
+    return _chat(SUMMARY_MODEL, SUMMARY_TEMPERATURE, _summary_messages(chunk, language))
+
+
+async def asummarize_chunk(chunk: str, language: str = "fr", *, aclient: AsyncOpenAI) -> str:
+    """Async twin of summarize_chunk, used by the concurrent map step."""
+    return await _achat(aclient, SUMMARY_MODEL, SUMMARY_TEMPERATURE, _summary_messages(chunk, language))
+
+
+async def _gather_with_sem(limit: int, coros) -> list:
+    """asyncio.gather with at most `limit` coroutines running at once (order preserved)."""
+    sem = asyncio.Semaphore(limit)
+
+    async def _guarded(coro):
+        async with sem:
+            return await coro
+
+    return await asyncio.gather(*(_guarded(c) for c in coros))
+
+
+def _summary_batch_messages(chunks: List[str], language: str) -> List[Dict[str, str]]:
+    n = len(chunks)
+    return [
+        {"role": "system", "content": _system_prompt("sum_batch", language)},
+        {"role": "user", "content": (
+            f"For EACH of the {n} texts in the JSON array below, write 5-10 concise bullet points. "
+            f"Respond in {_lang_label(language)}. Return a JSON object "
+            f'{{"summaries": [...]}} holding exactly {n} strings, in the same order as the texts.\n\n'
+            f"{json.dumps(chunks, ensure_ascii=False)}"
+        )},
+    ]
+
+
+async def asummarize_pack(chunks: List[str], language: str = "fr", *, aclient: AsyncOpenAI) -> Optional[List[str]]:
+    """
+    Summarize several chunks in a single request (JSON array in, JSON object out).
+    Returns None when the answer is malformed, so the caller can fall back.
+    """
+    content = await _achat(
+        aclient, SUMMARY_MODEL, SUMMARY_TEMPERATURE,
+        _summary_batch_messages(chunks, language),
+        response_format={"type": "json_object"},
     )
-    return resp.choices[0].message.content.strip()
+    try:
+        out = json.loads(content)["summaries"]
+    except (ValueError, KeyError, TypeError):
+        return None
+    if not isinstance(out, list) or len(out) != len(chunks):
+        return None
+    return [str(x).strip() for x in out]
 
 
-def reduce_summaries(summaries: List[str], language: str = "fr") -> str:
-    joined = "\n".join(summaries)
-    resp = _retry(
-        client.chat.completions.create,
-        model=SUMMARY_MODEL,
-        temperature=0.2,
-        messages=[
-            {"role": "system", "content": f"You merge overlapping bullets into a coherent high-level outline. Always respond in {_lang_label(language)}."},
-            {"role": "user", "content": f"Merge and deduplicate these bullet summaries into a crisp outline with sections and sub-bullets. Respond in {_lang_label(language)}.\n\n{joined}"},
-        ],
+async def _summarize_pack(pack: List[str], language: str, aclient: AsyncOpenAI) -> List[str]:
+    if len(pack) > 1:
+        out = await asummarize_pack(pack, language, aclient=aclient)
+        if out is not None:
+            return out
+        print("⚠️ Réponse batch invalide → résumés un par un", file=sys.stderr)
+    return list(await asyncio.gather(*(asummarize_chunk(c, language, aclient=aclient) for c in pack)))
+
+
+async def _with_aclient(fn, *args, **kwargs):
+    # One client per event loop: asyncio.run() closes its loop, so the client
+    # (and its connection pool) must not outlive it.
+    async with AsyncOpenAI() as aclient:
+        return await fn(*args, aclient=aclient, **kwargs)
+
+
+async def _summarize_all(chunks: List[str], language: str, aclient: AsyncOpenAI) -> List[str]:
+    packs = [chunks[i:i + SUMMARY_BATCH_SIZE] for i in range(0, len(chunks), SUMMARY_BATCH_SIZE)]
+    results = await _gather_with_sem(
+        SUMMARY_CONCURRENCY,
+        [_summarize_pack(p, language, aclient) for p in packs],
     )
-    return resp.choices[0].message.content.strip()
+    return [summary for pack in results for summary in pack]
 
 
-def generate_course_from_outline(outline_md: str, title_hint: Optional[str] = None, language: str = "fr") -> str:
+async def asummarize_chunks_batch(chunks: List[str], language: str = "fr", *, aclient: AsyncOpenAI) -> List[str]:
+    """
+    Map step shared by both pipelines: one summary per chunk, in order
+    (duplicate chunks cost a single request).
+    Chunks are packed SUMMARY_BATCH_SIZE per request and packs run concurrently.
+    """
+    if not chunks:
+        return []
+    # Identical chunks (intro/outro, repeated captions) are summarized once,
+    # then the summaries are scattered back to every position.
+    keys = [hashlib.blake2b(c.encode("utf-8"), digest_size=16).digest() for c in chunks]
+    key_to_idx: Dict[bytes, int] = {}
+    unique: List[str] = []
+    for c, k in zip(chunks, keys):
+        if k not in key_to_idx:
+            key_to_idx[k] = len(unique)
+            unique.append(c)
+    # Per-chunk cache lookup (same key as asummarize_chunk): only the misses
+    # are packed, so an edited chunk costs one summary instead of invalidating
+    # its whole pack, and content-defined boundaries keep the others stable.
+    results: List[Optional[str]] = [None] * len(unique)
+    cache_keys: List[str] = []
+    if LLM_CACHE_TTL:
+        cache_keys = [_summary_cache_key(c, language) for c in unique]
+        results = [llm_cache.get(ck) for ck in cache_keys]
+    todo = [i for i, r in enumerate(results) if r is None]
+    fresh = await _summarize_all([unique[i] for i in todo], language, aclient)
+    for i, summary in zip(todo, fresh):
+        results[i] = summary
+        if cache_keys:
+            llm_cache.set(cache_keys[i], summary, LLM_CACHE_TTL)
+    return [results[key_to_idx[k]] for k in keys]
+
+
+def summarize_chunks_batch(chunks: List[str], language: str = "fr") -> List[str]:
+    """Sync entry point for asummarize_chunks_batch."""
+    if not chunks:
+        return []
+    return asyncio.run(_with_aclient(asummarize_chunks_batch, chunks, language))
+
+
+def _reduce_messages(summaries: List[str], language: str) -> List[Dict[str, str]]:
+    joined = "\n".join(summaries)
+    return [
+        {"role": "system", "content": _system_prompt("reduce", language)},
+        {"role": "user", "content": f"Merge and deduplicate these bullet summaries into a crisp outline with sections and sub-bullets. Respond in {_lang_label(language)}.\n\n{joined}"},
+    ]
+
+
+def reduce_summaries(summaries: List[str], language: str = "fr") -> str:
+    return _chat(SUMMARY_MODEL, SUMMARY_TEMPERATURE, _reduce_messages(summaries, language))
+
+
+async def areduce_summaries(summaries: List[str], language: str = "fr", *, aclient: AsyncOpenAI) -> str:
+    return await _achat(aclient, SUMMARY_MODEL, SUMMARY_TEMPERATURE, _reduce_messages(summaries, language))
+
+
+def _course_messages(outline_md: str, title_hint: Optional[str], language: str) -> List[Dict[str, str]]:
     title_line = f"# {title_hint}" if title_hint else ""
-    resp = _retry(
-        client.chat.completions.create,
-        model=COURSE_MODEL,
-        temperature=0.4,
-        messages=[
-            {"role": "system", "content": f"You are a university-level course writer. Output Markdown only. Always respond in {_lang_label(language)}."},
-            {"role": "user", "content": f"""
+    return [
+        {"role": "system", "content": _system_prompt("course", language)},
+        {"role": "user", "content": f"""
 Write a complete, well-structured Markdown course using this outline. Requirements:
 1) Start with a single H1 title.
 2) Use bolded section headings (**Title**) followed by clear explanations.
@@ -299,19 +560,21 @@ Outline:
 
 {outline_md}
 """},
-        ],
-    )
-    return resp.choices[0].message.content.strip()
+    ]
 
 
-def generate_qcm(course_md: str, num_questions: int = 20, language: str = "fr") -> str:
-    resp = _retry(
-        client.chat.completions.create,
-        model=QCM_MODEL,
-        temperature=0.3,
-        messages=[
-            {"role": "system", "content": f"You are a rigorous examiner. Output Markdown only. Always respond in {_lang_label(language)}."},
-            {"role": "user", "content": f"""
+def generate_course_from_outline(outline_md: str, title_hint: Optional[str] = None, language: str = "fr") -> str:
+    return _chat(COURSE_MODEL, 0.4, _course_messages(outline_md, title_hint, language))
+
+
+async def agenerate_course_from_outline(outline_md: str, title_hint: Optional[str] = None, language: str = "fr", *, aclient: AsyncOpenAI) -> str:
+    return await _achat(aclient, COURSE_MODEL, 0.4, _course_messages(outline_md, title_hint, language))
+
+
+def _qcm_messages(course_md: str, num_questions: int, language: str) -> List[Dict[str, str]]:
+    return [
+        {"role": "system", "content": _system_prompt("qcm", language)},
+        {"role": "user", "content": f"""
 
 Generate a multiple-choice quiz with {num_questions} questions.
 STRICT FORMAT — exactly 6 lines per question, no extra text, no code fences:
@@ -334,19 +597,13 @@ Rules:
 
 {course_md}
 """},
-        ],
-    )
-    return resp.choices[0].message.content.strip()
+    ]
 
 
-def generate_exercises(course_md: str, count: int = 3, language: str = "fr") -> str:
-    resp = _retry(
-        client.chat.completions.create,
-        model=EXO_MODEL,
-        temperature=0.4,
-        messages=[
-            {"role": "system", "content": f"You are a university professor. Output Markdown only. Always respond in {_lang_label(language)}."},
-            {"role": "user", "content": f"""
+def _exercises_messages(course_md: str, count: int, language: str) -> List[Dict[str, str]]:
+    return [
+        {"role": "system", "content": _system_prompt("exo", language)},
+        {"role": "user", "content": f"""
 Write {count} open-ended, challenging exercises that require analysis, application, or synthesis (no rote recall). Give clear statements and expected directions, but no full solutions.
 Format:
 - **Exercise 1:** ...
@@ -357,18 +614,79 @@ Base it ONLY on this course:
 
 {course_md}
 """},
-        ],
+    ]
+
+
+def generate_qcm(course_md: str, num_questions: int = 20, language: str = "fr") -> str:
+    return _chat(QCM_MODEL, 0.3, _qcm_messages(course_md, num_questions, language))
+
+
+async def agenerate_qcm(course_md: str, num_questions: int = 20, language: str = "fr", *, aclient: AsyncOpenAI) -> str:
+    return await _achat(aclient, QCM_MODEL, 0.3, _qcm_messages(course_md, num_questions, language))
+
+
+def generate_exercises(course_md: str, count: int = 3, language: str = "fr") -> str:
+    return _chat(EXO_MODEL, 0.4, _exercises_messages(course_md, count, language))
+
+
+async def agenerate_exercises(course_md: str, count: int = 3, language: str = "fr", *, aclient: AsyncOpenAI) -> str:
+    return await _achat(aclient, EXO_MODEL, 0.4, _exercises_messages(course_md, count, language))
+
+
+async def agenerate_qcm_and_exercises(course_md: str, language: str = "fr", *, aclient: AsyncOpenAI) -> Tuple[str, str]:
+    """QCM and exercises only depend on the course: generate both concurrently."""
+    qcm, exos = await asyncio.gather(
+        agenerate_qcm(course_md, language=language, aclient=aclient),
+        agenerate_exercises(course_md, language=language, aclient=aclient),
     )
-    return resp.choices[0].message.content.strip()
+    return qcm, exos
+
+
+def generate_qcm_and_exercises(course_md: str, language: str = "fr") -> Tuple[str, str]:
+    """Sync entry point for agenerate_qcm_and_exercises."""
+    return asyncio.run(_with_aclient(agenerate_qcm_and_exercises, course_md, language))
 
 
 # =====================
 # 5) Pipelines
 # =====================
 
-def pipeline_from_audio(audio_path: str,
-                        title_hint: Optional[str] = None,
-                        language: str = "fr") -> PipelineOutputs:
+async def _acourse_from_transcript(segments: List[str],
+                                  title_hint: Optional[str],
+                                  language: str,
+                                  aclient: AsyncOpenAI) -> PipelineOutputs:
+    """Shared tail of both pipelines: chunks → map → reduce → course → QCM + exercises."""
+    print("✂️ Chunking…")
+    chunks = chunk_text(segments)
+
+    print("🧠 Résumés (map)…")
+    summaries = await asummarize_chunks_batch(chunks, language, aclient=aclient)
+    print("🧠 Fusion (reduce)…")
+    outline = await areduce_summaries(summaries, language=language, aclient=aclient)
+
+    print("📚 Génération du cours…")
+    course = await agenerate_course_from_outline(outline, title_hint, language=language, aclient=aclient)
+    print("🧪 Génération du QCM + exercices…")
+    qcm, exos = await agenerate_qcm_and_exercises(course, language, aclient=aclient)
+
+    return PipelineOutputs(
+        transcript="\n".join(segments).strip(),  # built once, for the DB only
+        chunks_preview=chunks[:3],
+        summaries_preview=summaries[:3],
+        course=course,
+        qcm=qcm,
+        exercises=exos,
+    )
+
+
+async def apipeline_from_audio(audio_path: str,
+                               title_hint: Optional[str] = None,
+                               language: str = "fr") -> PipelineOutputs:
+    """
+    Whole audio pipeline as one coroutine: every API call of a course is
+    awaited on the same loop and client, so a worker thread is never parked
+    on a single HTTP request.
+    """
     # Normalize once at the entry point
     audio_path = to_wsl_path(audio_path)                  # <<< NEW
     audio_path = str(Path(audio_path))
@@ -378,38 +696,18 @@ def pipeline_from_audio(audio_path: str,
     print("🔍 Vérification taille fichier…")
     parts: List[str] = []
     try:
-        parts = split_audio_by_size(audio_path, MAX_AUDIO_MB)
-
-        transcript_all = []
-        for i, p in enumerate(parts):
-            print(f"🎧 Transcription {i+1}/{len(parts)} : {p}")
-            tr = transcribe_audio(p)
-            transcript_all.append(tr)
-        transcript = "\n".join(transcript_all).strip()
-
-        print("✂️ Chunking…")
-        chunks = chunk_text(transcript)
-
-        print("🧠 Résumés (map)…")
-        summaries = [summarize_chunk(c, language=language) for c in chunks]
-        print("🧠 Fusion (reduce)…")
-        outline = reduce_summaries(summaries, language=language)
-
-        print("📚 Génération du cours…")
-        course = generate_course_from_outline(outline, title_hint, language=language)
-        print("🧪 Génération du QCM…")
-        qcm = generate_qcm(course, language=language)
-        print("🧠 Génération des exercices…")
-        exos = generate_exercises(course, language=language)
-
-        return PipelineOutputs(
-            transcript=transcript,
-            chunks_preview=chunks[:3],
-            summaries_preview=summaries[:3],
-            course=course,
-            qcm=qcm,
-            exercises=exos,
-        )
+        # ffmpeg/ffprobe are blocking subprocesses: keep them off the loop
+        parts = await asyncio.to_thread(split_audio_by_size, audio_path, MAX_AUDIO_MB)
+
+        async with AsyncOpenAI() as aclient:
+            # Whisper calls are I/O-bound: transcribe parts concurrently, order kept
+            print(f"🎧 Transcription de {len(parts)} partie(s)…")
+            transcript_all = await _gather_with_sem(
+                TRANSCRIBE_WORKERS,
+                [atranscribe_audio(p, aclient=aclient) for p in parts],
+            )
+            # Parts are chunked as a list: no joined copy of the transcript needed
+            return await _acourse_from_transcript(transcript_all, title_hint, language, aclient)
     finally:
         # 🧹 Cleanup des morceaux + (optionnel) du fichier original
         try:
@@ -418,59 +716,37 @@ def pipeline_from_audio(audio_path: str,
             pass
 
 
-def pipeline_from_text(raw_text: str,
-                       title_hint: Optional[str] = None,
-                       language: str = "fr") -> PipelineOutputs:
+async def apipeline_from_text(raw_text: str,
+                              title_hint: Optional[str] = None,
+                              language: str = "fr") -> PipelineOutputs:
     """NEW: Direct text mode, skipping audio/transcription."""
-    transcript = raw_text.strip()
-    print("✂️ Chunking (text)…")
-    chunks = chunk_text(transcript)
+    async with AsyncOpenAI() as aclient:
+        return await _acourse_from_transcript([raw_text], title_hint, language, aclient)
 
-    print("🧠 Résumés (map)…")
-    summaries = [summarize_chunk(c, language=language) for c in chunks]
-    print("🧠 Fusion (reduce)…")
-    outline = reduce_summaries(summaries, language=language)
 
-    print("📚 Génération du cours…")
-    course = generate_course_from_outline(outline, title_hint, language=language)
-    print("🧪 Génération du QCM…")
-    qcm = generate_qcm(course, language=language)
-    print("🧠 Génération des exercices…")
-    exos = generate_exercises(course, language=language)
+def pipeline_from_audio(audio_path: str,
+                        title_hint: Optional[str] = None,
+                        language: str = "fr") -> PipelineOutputs:
+    return asyncio.run(apipeline_from_audio(audio_path, title_hint, language))
 
-    return PipelineOutputs(
-        transcript=transcript,
-        chunks_preview=chunks[:3],
-        summaries_preview=summaries[:3],
-        course=course,
-        qcm=qcm,
-        exercises=exos,
-    )
+
+def pipeline_from_text(raw_text: str,
+                       title_hint: Optional[str] = None,
+                       language: str = "fr") -> PipelineOutputs:
+    return asyncio.run(apipeline_from_text(raw_text, title_hint, language))
 
 
 # =====================
 # 6) I/O helpers
 # =====================
 
-def save_outputs(base: str, out: PipelineOutputs) -> Dict[str, str]:
-    os.makedirs(os.path.dirname(base) or ".", exist_ok=True)
-    paths = {}
-
-    paths["transcript"] = f"{base}_transcript.txt"
-    with open(paths["transcript"], "w", encoding="utf-8") as f:
-        f.write(out.transcript)
+def _write_text(path: str, data: str) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(data)
 
-    paths["course"] = f"{base}_course.md"
-    with open(paths["course"], "w", encoding="utf-8") as f:
-        f.write(out.course)
 
-    paths["qcm"] = f"{base}_qcm.md"
-    with open(paths["qcm"], "w", encoding="utf-8") as f:
-        f.write(out.qcm)
-
-    paths["exercises"] = f"{base}_exercises.md"
-    with open(paths["exercises"], "w", encoding="utf-8") as f:
-        f.write(out.exercises)
+def save_outputs(base: str, out: PipelineOutputs) -> Dict[str, str]:
+    os.makedirs(os.path.dirname(base) or ".", exist_ok=True)
 
     meta = {
         "chunks_preview": out.chunks_preview,
@@ -483,11 +759,20 @@ def save_outputs(base: str, out: PipelineOutputs) -> Dict[str, str]:
             "transcribe": TRANSCRIBE_MODEL,
         },
     }
-    paths["meta"] = f"{base}_meta.json"
-    with open(paths["meta"], "w", encoding="utf-8") as f:
-        json.dump(meta, f, ensure_ascii=False, indent=2)
+    files = {
+        "transcript": (f"{base}_transcript.txt", out.transcript),
+        "course": (f"{base}_course.md", out.course),
+        "qcm": (f"{base}_qcm.md", out.qcm),
+        "exercises": (f"{base}_exercises.md", out.exercises),
+        "meta": (f"{base}_meta.json", json.dumps(meta, ensure_ascii=False, indent=2)),
+    }
+
+    # Independent files: write them concurrently to overlap I/O latency
+    with ThreadPoolExecutor(max_workers=len(files)) as ex:
+        for fut in [ex.submit(_write_text, path, data) for path, data in files.values()]:
+            fut.result()  # re-raise any write error
 
-    return paths
+    return {name: path for name, (path, _) in files.items()}
 
 
 # =====================
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-15 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0002_course_error_course_language_course_progress_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['user', '-created_at'], name='course_user_created_idx'),
+        ),
+    ]
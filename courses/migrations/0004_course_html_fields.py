@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-15 10:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0003_course_course_user_created_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='course_html',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='qcm_html',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='exercises_html',
+            field=models.TextField(blank=True),
+        ),
+    ]
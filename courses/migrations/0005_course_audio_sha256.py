@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-15 10:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0004_course_html_fields'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='audio_sha256',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=64),
+        ),
+    ]
@@ -16,16 +16,27 @@ class Course(models.Model):
     course_markdown = models.TextField(blank=True)
     qcm_markdown = models.TextField(blank=True)
     exercises_markdown = models.TextField(blank=True)
+    # HTML nettoyé, rendu une seule fois en fin de traitement (cf. tasks.py)
+    course_html = models.TextField(blank=True)
+    qcm_html = models.TextField(blank=True)
+    exercises_html = models.TextField(blank=True)
     audio_duration = models.IntegerField(default=0)  # utilisé comme “coût”
     processing = models.BooleanField(default=False)
 
     # Optionnels (conseillés)
     source_type = models.CharField(max_length=10, blank=True, default="")  # "audio" | "text"
     original_filename = models.CharField(max_length=255, blank=True, default="")
+    audio_sha256 = models.CharField(max_length=64, blank=True, default="", db_index=True)  # dédup des uploads audio
     created_at = models.DateTimeField(auto_now_add=True)
 
     state = models.CharField(max_length=32, default="PENDING")   # PENDING/STARTED/PROGRESS/SUCCESS/FAILURE
     progress = models.PositiveSmallIntegerField(default=0)
     error = models.TextField(null=True, blank=True)
     transcript_text = models.TextField(null=True, blank=True)               # transcript complet
-    language = models.CharField(max_length=5, default="fr")   
\ No newline at end of file
+    language = models.CharField(max_length=5, default="fr")   
+
+    class Meta:
+        indexes = [
+            # Liste des cours du profil : filter(user=...).order_by("-created_at")
+            models.Index(fields=["user", "-created_at"], name="course_user_created_idx"),
+        ]
@@ -0,0 +1,16 @@
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Course
+
+
+def user_courses_cache_key(user_id) -> str:
+    """Clé du cache de la première page de cours affichée sur le profil."""
+    return f"user_courses:{user_id}"
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def invalidate_user_courses(sender, instance, **kwargs):
+    cache.delete(user_courses_cache_key(instance.user_id))
@@ -1,8 +1,10 @@
 # courses/tasks.py
+import asyncio
 from pathlib import Path
 from celery import shared_task
-from .logic import pipeline_from_audio, pipeline_from_text, to_wsl_path  # <<< NEW
+from .logic import apipeline_from_audio, apipeline_from_text, to_wsl_path  # <<< NEW
 from .models import Course
+from .utils.sanitize import md_to_safe_html
 
 
 @shared_task
@@ -11,16 +13,16 @@ def process_course_task(course_id: int, source_type: str, payload: str, title: s
     source_type: "audio" -> payload = absolute audio path (Windows or POSIX)
                  "text"  -> payload = raw text
     """
-    course = Course.objects.get(id=course_id)
-
-    # Guard: avoid double-processing if someone re-clicks
-    if getattr(course, "state", "") == "SUCCESS":
+    # Guard + mark started in one conditional UPDATE: no double-processing
+    # if someone re-clicks, even when both tasks run at the same time.
+    started = (Course.objects.filter(pk=course_id)
+               .exclude(state="SUCCESS")
+               .update(state="STARTED", processing=True))
+    if not started:
         return "Already processed"
 
-    # Mark started (simple, no progress dance)
-    course.state = "STARTED"
-    course.processing = True
-    course.save(update_fields=["state", "processing"])
+    # Minimal instance for the final save (post_save needs user_id)
+    course = Course.objects.only("id", "user_id", "state").get(pk=course_id)
 
     try:
         if source_type == "audio":
@@ -28,28 +30,29 @@ def process_course_task(course_id: int, source_type: str, payload: str, title: s
             audio_path_norm = to_wsl_path(payload)  # <<< NEW
             p = Path(audio_path_norm)
             if not p.exists():
-                # Log in DB for debugging
-                course.error = f"Audio file not found: {audio_path_norm}"
-                course.state = "FAILURE"
-                course.processing = False
-                course.save(update_fields=["error", "state", "processing"])
-                raise FileNotFoundError(f"Missing file: {audio_path_norm}")
+                # Logged in DB by the single FAILURE write below
+                raise FileNotFoundError(f"Audio file not found: {audio_path_norm}")
 
-            outs = pipeline_from_audio(str(p), title_hint=title, language=language)
+            outs = asyncio.run(apipeline_from_audio(str(p), title_hint=title, language=language))
 
         else:
-            outs = pipeline_from_text(payload, title_hint=title, language=language)
+            outs = asyncio.run(apipeline_from_text(payload, title_hint=title, language=language))
 
         # Single write of final results
         course.transcript_text     = outs.transcript
         course.course_markdown     = outs.course
         course.qcm_markdown        = outs.qcm
         course.exercises_markdown  = outs.exercises
+        # Rendered once here rather than on every page view
+        course.course_html         = md_to_safe_html(outs.course)
+        course.qcm_html            = md_to_safe_html(outs.qcm)
+        course.exercises_html      = md_to_safe_html(outs.exercises)
         course.processing          = False
         course.state               = "SUCCESS"
         course.save(update_fields=[
             "transcript_text", "course_markdown", "qcm_markdown",
-            "exercises_markdown", "processing", "state"
+            "exercises_markdown", "course_html", "qcm_html",
+            "exercises_html", "processing", "state"
         ])
         return "OK"
 
@@ -8,4 +8,5 @@ urlpatterns = [
     path("course/<int:course_id>/", views.course_detail, name="course_detail"),
     path("course/<int:course_id>/delete/", views.delete_course, name="delete_course"),
     path("course/<int:course_id>/rename/", views.rename_course, name="rename_course"),
+    path("course/<int:course_id>/status/", views.course_status, name="course_status"),
 ]
\ No newline at end of file
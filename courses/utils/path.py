@@ -1,11 +1,13 @@
 import re
 
+_WIN_DRIVE_RE = re.compile(r"[A-Za-z]:\\")
+
 def to_wsl_path(p: str) -> str:
     # C:\Users\...  ->  /mnt/c/Users/...
-    if p is None:
+    # Chemins POSIX (cas courant) : on sort avant le regex
+    if p is None or len(p) < 3 or p[1] != ":":
         return p
-    if re.match(r"^[A-Za-z]:\\", p):
+    if _WIN_DRIVE_RE.match(p):
         drive = p[0].lower()
-        p = p.replace("\\", "/")
-        return f"/mnt/{drive}/{p[3:]}"
+        return f"/mnt/{drive}/" + p[3:].replace("\\", "/")
     return p
\ No newline at end of file
@@ -1,6 +1,7 @@
-# views.py — version clean avec fallback mutagen→pydub/ffmpeg pour la durée MP3
+# views.py — version clean avec fallback mutagen→ffprobe pour la durée MP3
 import uuid
 import os
+import hashlib
 import math
 import traceback
 from pathlib import Path
@@ -24,44 +25,38 @@ from .tasks import process_course_task
 from .logic import (
     pipeline_from_audio,
     pipeline_from_text,
+    probe_duration_seconds,
 )
 
 # =========================
 # Helpers robustes
 # =========================
 
-# Compteur de tokens : on essaye tiktoken si présent, sinon fallback grossier
-try:
-    import tiktoken
-    _ENC = tiktoken.get_encoding("cl100k_base")
+# Compteur de tokens approximatif (ratio caractères/token) : pour la
+# comptabilité des crédits, un ordre de grandeur suffit, pas besoin de tiktoken.
+_CHARS_PER_TOKEN = {"fr": 3.5, "en": 4.0}
 
-    def _count_tokens(text: str) -> int:
-        return len(_ENC.encode(text))
+def _count_tokens(text: str, lang: str = "fr") -> int:
+    return max(1, int(len(text) / _CHARS_PER_TOKEN.get(lang, 4.0)))
 
-except Exception:
-    def _count_tokens(text: str) -> int:
-        # Fallback très grossier (≈ 1 token / 4 caractères)
-        return max(1, len(text) // 4)
-
-def _text_seconds_equiv(text: str) -> int:
+def _text_seconds_equiv(text: str, lang: str = "fr") -> int:
     """
     Approximation : ~3 tokens ≈ 1 seconde "équivalente audio".
     Sert uniquement à débiter des crédits de manière homogène texte vs audio.
     Ajuste le ratio si tu veux un pricing différent.
     """
-    tokens = _count_tokens(text or "")
+    tokens = _count_tokens(text or "", lang)
     return int(math.ceil(tokens / 3))
 
 def get_audio_duration_seconds(audio_abs_path: str) -> int:
     """
     Retourne la durée en secondes d'un fichier audio (MP3 notamment).
-    Stratégie à 3 étages :
-      1) mutagen.mp3.MP3 (spécifique MP3)
-      2) mutagen.File (générique)
-      3) pydub + ffmpeg (lit le flux, très robuste si ffmpeg dispo)
+    Stratégie à 2 étages, sans jamais décoder le flux :
+      1) mutagen.File (lit les en-têtes, détecte le format)
+      2) ffprobe (métadonnées du conteneur)
 
-    Si ffmpeg n'est pas dans le PATH, tu peux définir la variable d'env FFMPEG_BIN
-    (ex: FFMPEG_BIN=C:\\ffmpeg\\bin\\ffmpeg.exe) — le code ci-dessous la prend en compte.
+    Si ffprobe n'est pas dans le PATH, tu peux définir la variable d'env FFPROBE_BIN
+    (ex: FFPROBE_BIN=C:\\ffmpeg\\bin\\ffprobe.exe).
     """
     # Sanity checks
     if not os.path.isfile(audio_abs_path):
@@ -69,37 +64,22 @@ def get_audio_duration_seconds(audio_abs_path: str) -> int:
     if os.path.getsize(audio_abs_path) == 0:
         raise ValueError("Fichier audio vide")
 
-    # 1) mutagen.mp3.MP3 (spécifique MP3, plus fiable sur certains encodages)
-    try:
-        from mutagen.mp3 import MP3  # type: ignore
-        mp3 = MP3(audio_abs_path)
-        if mp3 and mp3.info and getattr(mp3.info, "length", None):
-            return int(mp3.info.length)
-    except Exception:
-        pass  # on tente plus loin
-
-    # 2) mutagen.File (générique)
+    # 1) mutagen.File (générique, MP3 compris)
     try:
         from mutagen import File as MutagenFile  # type: ignore
         m = MutagenFile(audio_abs_path)
         if m and getattr(m, "info", None) and getattr(m.info, "length", None):
             return int(m.info.length)
     except Exception:
-        pass
+        pass  # on tente plus loin
 
-    # 3) pydub + ffmpeg (lit réellement le flux)
+    # 2) ffprobe (lit seulement les en-têtes)
     try:
-        from pydub import AudioSegment  # type: ignore
-        ffbin = os.environ.get("FFMPEG_BIN")
-        if ffbin:
-            # Pydub cherche ffmpeg dans PATH; on peut le forcer via cette variable
-            AudioSegment.converter = ffbin
-        seg = AudioSegment.from_file(audio_abs_path)
-        return int(round(len(seg) / 1000.0))
+        return int(probe_duration_seconds(audio_abs_path))
     except Exception as e:
         raise ValueError(
-            "Durée audio introuvable (mutagen et pydub/ffmpeg ont échoué). "
-            "Installe ffmpeg et/ou définis FFMPEG_BIN, et vérifie le fichier. "
+            "Durée audio introuvable (mutagen et ffprobe ont échoué). "
+            "Installe ffmpeg et/ou définis FFPROBE_BIN, et vérifie le fichier. "
             f"Détail: {e}"
         )
 # =========================
@@ -112,18 +92,23 @@ from django.core.exceptions import ValidationError
 MAX_TEXT_CHARS = 200_000            # hard cap for pasted/uploaded text
 MAX_AUDIO_MB   = 100                # hard cap for audio size
 
-# MIME check (needs python-magic: pip install python-magic)
-try:
-    import magic
-    def _mime_of(django_file) -> str:
-        head = django_file.read(4096)
-        django_file.seek(0)
-        return magic.from_buffer(head, mime=True)
-except Exception:
-    magic = None
-    def _mime_of(django_file) -> str:
-        # Fallback: trust extension only (less secure). Prefer installing python-magic.
-        return "application/octet-stream"
+# MIME check on the file header (pure-Python table, no libmagic to load)
+import filetype
+
+def _mime_of(django_file) -> str:
+    head = django_file.read(4096)
+    django_file.seek(0)
+    kind = filetype.guess(head)
+    # filetype ne reconnaît pas le texte brut : octet-stream, comme un navigateur
+    return kind.mime if kind else "application/octet-stream"
+
+def _sha256_of(django_file) -> str:
+    """Empreinte du fichier uploadé, lue par blocs de 1 Mo (puis rembobinée)."""
+    h = hashlib.sha256()
+    for chunk in django_file.chunks(chunk_size=1024 * 1024):
+        h.update(chunk)
+    django_file.seek(0)
+    return h.hexdigest()
 
 def text_chars(payload: str) -> int:
     payload = (payload or "").replace("\r\n", "\n").strip()
@@ -163,6 +148,8 @@ def upload_course(request):
         payload = None
         duration_seconds = 0
         text_chars_count = 0
+        audio_sha256 = ""
+        reused_transcript = None
         orig_name = "unknown"
 
         if audio_file:
@@ -179,27 +166,45 @@ def upload_course(request):
                 messages.error(request, f"Type de fichier invalide ({mime}).")
                 return render(request, "upload_course.html", {"form": form})
 
-            # Generate safe name & store
+            # Même fichier déjà transcrit dans la même langue ? On réutilise sa
+            # transcription (et sa durée : même fichier) au lieu de repayer Whisper,
+            # sans même stocker l'upload.
+            audio_sha256 = _sha256_of(audio_file)
+            reused = (
+                Course.objects
+                .filter(audio_sha256=audio_sha256, state="SUCCESS", language=language, audio_duration__gt=0)
+                .exclude(transcript_text__isnull=True)
+                .exclude(transcript_text="")
+                .values_list("transcript_text", "audio_duration")
+                .first()
+            )
+
+            # Generate safe name
             ext = os.path.splitext(getattr(audio_file, "name", "audio"))[1].lower() or ".bin"
             safe_name = f"{uuid.uuid4().hex}{ext}"
-            upload_dir = os.path.join("uploads", "audio")
-            stored_rel_path = default_storage.save(os.path.join(upload_dir, safe_name), audio_file)
-            audio_abs_path = os.path.join(settings.MEDIA_ROOT, stored_rel_path)
+            orig_name = safe_name
 
-            # Derive duration
-            try:
-                duration_seconds = get_audio_duration_seconds(audio_abs_path)
-            except Exception as e:
-                # Remove bad file if unreadable
-                try:
-                    default_storage.delete(stored_rel_path)
-                except Exception:
-                    pass
-                messages.error(request, f"Durée audio invalide: {e}")
-                return render(request, "upload_course.html", {"form": form})
+            if reused:
+                reused_transcript, duration_seconds = reused
+            else:
+                # Store
+                upload_dir = os.path.join("uploads", "audio")
+                stored_rel_path = default_storage.save(os.path.join(upload_dir, safe_name), audio_file)
+                audio_abs_path = os.path.join(settings.MEDIA_ROOT, stored_rel_path)
 
-            payload = audio_abs_path
-            orig_name = safe_name
+                # Derive duration
+                try:
+                    duration_seconds = get_audio_duration_seconds(audio_abs_path)
+                except Exception as e:
+                    # Remove bad file if unreadable
+                    try:
+                        default_storage.delete(stored_rel_path)
+                    except Exception:
+                        pass
+                    messages.error(request, f"Durée audio invalide: {e}")
+                    return render(request, "upload_course.html", {"form": form})
+
+                payload = audio_abs_path
 
         elif text_input:
             source_type = "text"
@@ -237,33 +242,27 @@ def upload_course(request):
             text_chars_count = text_chars(payload)
             orig_name = getattr(text_file, "name", "text_file.txt")
 
-        # ---------- Credits (unchanged) ----------
+        # ---------- Credits (débit conditionnel en un seul UPDATE, sans pré-vérification) ----------
         if source_type == "audio":
             if duration_seconds <= 0:
                 messages.error(request, "Durée audio invalide.")
                 return render(request, "upload_course.html", {"form": form})
-            if not user.has_enough_audio(duration_seconds):
+            if not user.debit_audio(duration_seconds):
                 messages.error(
                     request,
                     f"Crédits audio insuffisants. Restant: {user.audio_credits_s}s, requis: {duration_seconds}s."
                 )
                 return redirect("account_page")
-            if not user.debit_audio(duration_seconds):
-                messages.error(request, "Crédits audio insuffisants (concurrence). Réessaie.")
-                return redirect("account_page")
         else:
             if text_chars_count == 0:
                 messages.error(request, "Texte vide.")
                 return render(request, "upload_course.html", {"form": form})
-            if not user.has_enough_text(text_chars_count):
+            if not user.debit_text(text_chars_count):
                 messages.error(
                     request,
                     f"Crédits texte insuffisants. Restant: {user.text_credits_ch} ch, requis: {text_chars_count} ch."
                 )
                 return redirect("account_page")
-            if not user.debit_text(text_chars_count):
-                messages.error(request, "Crédits texte insuffisants (concurrence). Réessaie.")
-                return redirect("account_page")
 
         # ---------- Create course (escape plain text fields) ----------
         course = Course.objects.create(
@@ -274,7 +273,8 @@ def upload_course(request):
             course_markdown="",                           # will be filled by task
             qcm_markdown="",
             exercises_markdown="",
-            transcript_text="",
+            transcript_text=reused_transcript or "",
+            audio_sha256=audio_sha256,
             audio_duration=(duration_seconds if source_type == "audio" else 0),
             processing=True,
             source_type=source_type,
@@ -284,12 +284,15 @@ def upload_course(request):
             error=""
         )
 
-        # ---------- Dispatch Celery (unchanged) ----------
+        # ---------- Dispatch Celery ----------
+        # Transcription déjà connue : pipeline texte directement
+        task_source, task_payload = (("text", reused_transcript) if reused_transcript
+                                     else (source_type, payload))
         try:
             async_result = process_course_task.delay(
                 course.id,
-                source_type,
-                payload,
+                task_source,
+                task_payload,
                 title,
                 language or "fr"
             )
@@ -322,7 +325,13 @@ def course_detail(request, course_id):
     Page de détail d'un cours de l'utilisateur.
     Affiche les champs Course.* (markdowns, transcript, états, etc.).
     """
-    course = get_object_or_404(Course, id=course_id, user=request.user)
+    # Pas de transcript ni de markdown brut : le HTML est pré-rendu. Le markdown
+    # n'est chargé (requête différée) que pour les anciens cours sans HTML.
+    course = get_object_or_404(
+        Course.objects.only("id", "user_id", "title", "description",
+                            "course_html", "exercises_html", "qcm_markdown"),
+        id=course_id, user=request.user,
+    )
     return render(request, "course_detail.html", {"course": course})
 
 @login_required
@@ -330,7 +339,7 @@ def delete_course(request, course_id):
     """
     Suppression d'un cours (avec confirmation côté template).
     """
-    course = get_object_or_404(Course, id=course_id, user=request.user)
+    course = get_object_or_404(Course.objects.only("id", "user_id", "title"), id=course_id, user=request.user)
     if request.method == "POST":
         course.delete()
         messages.success(request, "Le cours a bien été supprimé.")
@@ -342,7 +351,9 @@ def rename_course(request, course_id):
     """
     Renommer un cours (titre + description).
     """
-    course = get_object_or_404(Course, id=course_id, user=request.user)
+    course = get_object_or_404(
+        Course.objects.only("id", "user_id", "title", "description"), id=course_id, user=request.user
+    )
     if request.method == "POST":
         new_title = request.POST.get("title", "").strip()
         new_description = request.POST.get("description", "").strip()
@@ -357,22 +368,16 @@ def rename_course(request, course_id):
             messages.error(request, "Le titre ne peut pas être vide.")
     return render(request, "rename_course.html", {"course": course})
 
+_STATUS_FIELDS = ("state", "progress", "processing", "error")
+
 @login_required
 def course_status(request, course_id):
     """
-    Renvoie un JSON léger avec l'état du traitement.
-    Utile si tu veux rafraîchir la page via JS sans la recharger.
+    Renvoie un JSON léger avec l'état du traitement (interrogé par le tableau de bord).
+    Requête courte : 4 colonnes, aucun flux ouvert qui bloquerait un thread.
     """
-    try:
-        course = Course.objects.get(id=course_id, user=request.user)
-    except Course.DoesNotExist:
+    data = Course.objects.filter(id=course_id, user=request.user).values(*_STATUS_FIELDS).first()
+    if data is None:
         raise Http404
-
-    data = {
-        "state": getattr(course, "state", "UNKNOWN"),
-        "progress": getattr(course, "progress", 0),
-        "processing": getattr(course, "processing", False),
-        "error": getattr(course, "error", "") or "",
-        "has_result": bool(course.course_markdown or course.qcm_markdown or course.exercises_markdown),
-    }
+    data["error"] = data["error"] or ""
     return JsonResponse(data)
@@ -1,25 +1,31 @@
 # Django settings for omya_v4 project.
 import os
+from functools import lru_cache
 from pathlib import Path
-from urllib.parse import urlparse
+from urllib.parse import parse_qsl, unquote, urlparse
 from dotenv import load_dotenv
 
-# Charge .env à la racine (dev/local)
-load_dotenv()
+# Charge .env à la racine (dev/local uniquement : en prod, Render fournit l'env)
+if os.environ.get("DJANGO_ENV", "dev") != "prod":
+    load_dotenv()
+
+# Instantané de l'environnement (après .env) : une seule lecture, réutilisée
+# par tout le fichier et par settings_prod
+_env = dict(os.environ)
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 # -------------------------
 # Core / Security
 # -------------------------
-SECRET_KEY = os.environ.get("DJANGO_SECRET_KEY", "dev-insecure-key")
-DEBUG = os.environ.get("DJANGO_DEBUG", "False").lower() == "true"
+SECRET_KEY = _env.get("DJANGO_SECRET_KEY", "dev-insecure-key")
+DEBUG = _env.get("DJANGO_DEBUG", "False").lower() == "true"
 
-ALLOWED_HOSTS = [h.strip() for h in os.environ.get("DJANGO_ALLOWED_HOSTS", "localhost,127.0.0.1").split(",") if h.strip()]
-CSRF_TRUSTED_ORIGINS = [o.strip() for o in os.environ.get("DJANGO_TRUSTED_CSRF_ORIGINS", "").split(",") if o.strip()]
+ALLOWED_HOSTS = [h.strip() for h in _env.get("DJANGO_ALLOWED_HOSTS", "localhost,127.0.0.1").split(",") if h.strip()]
+CSRF_TRUSTED_ORIGINS = [o.strip() for o in _env.get("DJANGO_TRUSTED_CSRF_ORIGINS", "").split(",") if o.strip()]
 
 LANGUAGE_CODE = "en-us"
-TIME_ZONE = os.environ.get("DJANGO_TIME_ZONE", "UTC")
+TIME_ZONE = _env.get("DJANGO_TIME_ZONE", "UTC")
 USE_I18N = True
 USE_TZ = True
 
@@ -42,7 +48,7 @@ INSTALLED_APPS = [
     "django.contrib.sites",
     "allauth",
     "allauth.account",
-    "allauth.socialaccount",
+    # allauth.socialaccount retiré : aucun fournisseur social configuré
 ]
 SITE_ID = 1
 
@@ -81,31 +87,56 @@ WSGI_APPLICATION = "omya_v4.wsgi.application"
 # -------------------------
 # Si DATABASE_URL est défini -> l'utiliser (Postgres recommandé en prod)
 # Sinon -> SQLite (défaut)
-DATABASE_URL = os.environ.get("DATABASE_URL", "").strip()
+DATABASE_URL = _env.get("DATABASE_URL", "").strip()
 
-if DATABASE_URL:
-    # Parsing simple (sans dj-database-url pour rester léger)
-    parsed = urlparse(DATABASE_URL)
-    ENGINE_MAP = {
-        "postgres": "django.db.backends.postgresql",
-        "postgresql": "django.db.backends.postgresql",
-        "psql": "django.db.backends.postgresql",
-        "mysql": "django.db.backends.mysql",
-        "mariadb": "django.db.backends.mysql",
-        "sqlite": "django.db.backends.sqlite3",
-    }
-    ENGINE = ENGINE_MAP.get(parsed.scheme, "django.db.backends.postgresql")
-    DB_NAME = parsed.path.lstrip("/")
-    DATABASES = {
-        "default": {
-            "ENGINE": ENGINE,
-            "NAME": DB_NAME,
-            "USER": parsed.username,
-            "PASSWORD": parsed.password,
-            "HOST": parsed.hostname,
-            "PORT": parsed.port or "",
-        }
+# Pool de connexions Postgres (Django 5.1+) : nécessite psycopg 3 + psycopg_pool,
+# donc opt-in (DB_POOL=1). Incompatible avec les connexions persistantes.
+DB_POOL = _env.get("DB_POOL", "0").lower() in ("1", "true")
+DB_POOL_OPTIONS = {"min_size": 2, "max_size": 10, "timeout": 10}
+
+_ENGINE_MAP = {
+    "postgres": "django.db.backends.postgresql",
+    "postgresql": "django.db.backends.postgresql",
+    "psql": "django.db.backends.postgresql",
+    "mysql": "django.db.backends.mysql",
+    "mariadb": "django.db.backends.mysql",
+    "sqlite": "django.db.backends.sqlite3",
+}
+
+
+@lru_cache(maxsize=2)
+def _build_database_config(url: str, ssl_require: bool = False) -> dict:
+    """
+    DATABASES["default"] depuis une URL (parsing simple, sans dj-database-url).
+    Mis en cache : settings_prod réutilise le même résultat au lieu de re-parser.
+    """
+    parsed = urlparse(url)
+    engine = _ENGINE_MAP.get(parsed.scheme, "django.db.backends.postgresql")
+    options = dict(parse_qsl(parsed.query))  # ex: ?sslmode=require
+    config = {
+        "ENGINE": engine,
+        "NAME": unquote(parsed.path.lstrip("/")),
+        "USER": unquote(parsed.username or ""),
+        "PASSWORD": unquote(parsed.password or ""),
+        "HOST": parsed.hostname or "",
+        "PORT": parsed.port or "",
+        # Connexions persistantes : évite un handshake TCP+TLS+auth par requête
+        "CONN_MAX_AGE": int(_env.get("DB_CONN_MAX_AGE", 600)),
+        "CONN_HEALTH_CHECKS": True,
     }
+    if engine == "django.db.backends.postgresql":
+        if ssl_require:
+            options["sslmode"] = "require"
+        if DB_POOL:
+            config["CONN_MAX_AGE"] = 0
+            options["pool"] = dict(DB_POOL_OPTIONS)
+    if options:
+        config["OPTIONS"] = options
+    return config
+
+
+if DATABASE_URL:
+    DATABASES = {"default": _build_database_config(DATABASE_URL)}
 else:
     DATABASES = {
         "default": {
@@ -130,29 +161,47 @@ AUTH_PASSWORD_VALIDATORS = [
 # Static & Media
 # -------------------------
 STATIC_URL = "static/"
-STATIC_ROOT = os.environ.get("STATIC_ROOT") or str(BASE_DIR / "staticfiles")
+STATIC_ROOT = _env.get("STATIC_ROOT") or str(BASE_DIR / "staticfiles")
 
 MEDIA_URL = "/media/"
-MEDIA_ROOT = os.environ.get("MEDIA_ROOT") or str(BASE_DIR / "media")
+MEDIA_ROOT = _env.get("MEDIA_ROOT") or str(BASE_DIR / "media")
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 # -------------------------
 # Third-party keys (env)
 # -------------------------
-STRIPE_PUBLIC_KEY = os.environ.get("STRIPE_PUBLIC_KEY")
-STRIPE_SECRET_KEY = os.environ.get("STRIPE_SECRET_KEY")
-STRIPE_WEBHOOK_SECRET = os.environ.get("STRIPE_WEBHOOK_SECRET")
+STRIPE_PUBLIC_KEY = _env.get("STRIPE_PUBLIC_KEY")
+STRIPE_SECRET_KEY = _env.get("STRIPE_SECRET_KEY")
+STRIPE_WEBHOOK_SECRET = _env.get("STRIPE_WEBHOOK_SECRET")
 
-OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
+# subscription_required se fie à CustomUser.subscription (synchronisé par signal) ;
+# True réactive la vérification de l'abonnement actif en base (contrôle / réconciliation)
+SUBSCRIPTION_DB_CHECK = _env.get("SUBSCRIPTION_DB_CHECK", "False").lower() == "true"
+
+OPENAI_API_KEY = _env.get("OPENAI_API_KEY")
 
 # -------------------------
 # Celery / Redis (optionnel)
 # -------------------------
-REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379")
+REDIS_URL = _env.get("REDIS_URL", "redis://localhost:6379")
 CELERY_BROKER_URL = REDIS_URL
 CELERY_RESULT_BACKEND = REDIS_URL
 
+# Cache Django : Redis dès que REDIS_URL est fourni (prod), mémoire locale sinon
+if "REDIS_URL" in _env:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+            "KEY_PREFIX": "omya",
+        }
+    }
+else:
+    CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    }
+
 # -------------------------
 # Security headers (auto selon DEBUG)
 # -------------------------
@@ -175,6 +224,8 @@ LOGGING = {
     },
     "loggers": {
         "django": {"handlers": ["console"], "level": "WARNING",},
+        # Webhook Stripe (logger "subscriptions.webhook") : formatage paresseux, filtré par niveau
+        "subscriptions": {"handlers": ["console"], "level": "INFO", "propagate": False},
         # Décommente pour voir le SQL en dev :
         # "django.db.backends": {"handlers": ["console"], "level": "DEBUG"},
     },
@@ -199,8 +250,8 @@ EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
 EMAIL_HOST = "smtp.gmail.com"
 EMAIL_PORT = 587
 EMAIL_USE_TLS = True
-EMAIL_HOST_USER = os.environ.get("EMAIL_HOST_USER")
-EMAIL_HOST_PASSWORD = os.environ.get("EMAIL_HOST_PASSWORD")
+EMAIL_HOST_USER = _env.get("EMAIL_HOST_USER")
+EMAIL_HOST_PASSWORD = _env.get("EMAIL_HOST_PASSWORD")
 
 DEFAULT_FROM_EMAIL = "OMYA <therealomya@gmail.com>"
 
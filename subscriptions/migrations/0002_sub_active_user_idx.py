@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-15 11:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscriptions', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='subscription',
+            name='subscriptio_user_id_603d43_idx',
+        ),
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(condition=models.Q(('canceled_at__isnull', True)), fields=['user'], name='sub_active_user_idx'),
+        ),
+    ]
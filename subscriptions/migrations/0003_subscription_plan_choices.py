@@ -0,0 +1,46 @@
+# Generated by Django 5.2.6 on 2026-10-15 11:45
+
+from django.db import migrations, models
+from django.db.models.functions import Lower
+
+
+PLAN_VALUES = ['free', 'student', 'pro', 'team']
+
+
+def normalize_product_names(apps, schema_editor):
+    # Les anciennes lignes peuvent être en casse libre : on aligne sur les choix.
+    # Une valeur inconnue n'est pas réécrite (ce serait un downgrade silencieux) :
+    # la migration échoue et liste les lignes à corriger à la main.
+    Subscription = apps.get_model('subscriptions', 'Subscription')
+    unknown = list(
+        Subscription.objects
+        .annotate(plan=Lower('product_name'))
+        .exclude(plan__in=PLAN_VALUES)
+        .values_list('pk', 'product_name')
+    )
+    if unknown:
+        raise RuntimeError(
+            "Subscription.product_name inconnu, à corriger avant de migrer : "
+            + ", ".join(f"#{pk}={name!r}" for pk, name in unknown)
+        )
+    Subscription.objects.update(product_name=Lower('product_name'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscriptions', '0002_sub_active_user_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_product_names, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='subscription',
+            name='product_name',
+            field=models.CharField(choices=[('free', 'Free'), ('student', 'Student'), ('pro', 'Pro'), ('team', 'Team')], max_length=16),
+        ),
+        migrations.AddConstraint(
+            model_name='subscription',
+            constraint=models.CheckConstraint(condition=models.Q(('product_name__in', ['free', 'student', 'pro', 'team'])), name='subscription_product_name_valid'),
+        ),
+    ]
@@ -1,10 +1,23 @@
 # subscriptions/models.py
+from types import MappingProxyType
 from django.db import models
+from django.db.models import Q
 from django.utils import timezone
 from accounts.models import CustomUser
 from dateutil.relativedelta import relativedelta
 from django.conf import settings
 
+class Plan(models.TextChoices):
+    FREE = 'free', 'Free'
+    STUDENT = 'student', 'Student'
+    PRO = 'pro', 'Pro'
+    TEAM = 'team', 'Team'
+
+
+# Niveau de chaque plan (valeurs normalisées par la contrainte en base : pas de .lower())
+_TIERS = MappingProxyType({Plan.STUDENT: 1, Plan.PRO: 2, Plan.TEAM: 3})
+
+
 class Subscription(models.Model):
    # user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='subscriptions')
     user = models.ForeignKey(
@@ -14,15 +27,21 @@ class Subscription(models.Model):
     )
     customer_id = models.CharField(max_length=255, blank=True, null=True)
     subscription_id = models.CharField(max_length=255, unique=True)
-    product_name = models.CharField(max_length=32)
+    product_name = models.CharField(max_length=16, choices=Plan.choices)
     price = models.IntegerField(default=0)
     interval = models.CharField(max_length=16, default="month")
     start_date = models.DateTimeField(auto_now_add=True)
     canceled_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
+        # subscription_id est unique (donc déjà indexé) et la FK user a son propre index :
+        # un composite (subscription_id, canceled_at) ou (user, canceled_at) ferait doublon.
         indexes = [
-            models.Index(fields=['user', 'canceled_at']),
+            # Partiel : seuls les abonnements actifs (lookup de subscription_required)
+            models.Index(fields=['user'], condition=Q(canceled_at__isnull=True), name='sub_active_user_idx'),
+        ]
+        constraints = [
+            models.CheckConstraint(condition=Q(product_name__in=Plan.values), name='subscription_product_name_valid'),
         ]
 
     @property
@@ -31,7 +50,7 @@ class Subscription(models.Model):
 
     @property
     def tier(self):
-        return {'student':1,'pro':2,'team':3}.get((self.product_name or '').lower(), 0)
+        return _TIERS.get(self.product_name, 0)
 
     def __str__(self):
         return f"{self.user.username} - {self.product_name} ({'Active' if self.is_active else 'Inactive'})"
@@ -39,11 +58,27 @@ class Subscription(models.Model):
     def next_billing_date(self):
         if not self.is_active: return None
         now_dt = timezone.now()
-        nxt = self.start_date
+        start = self.start_date
+        # Nombre de périodes écoulées calculé directement (pas de boucle),
+        # échéances toujours ancrées sur le jour de start_date
         if self.interval == 'month':
-            while nxt <= now_dt: nxt += relativedelta(months=1)
-            return nxt
-        if self.interval == 'year':
-            while nxt <= now_dt: nxt += relativedelta(years=1)
-            return nxt
-        return None
+            periods = max(0, (now_dt.year - start.year) * 12 + (now_dt.month - start.month))
+            unit = 'months'
+        elif self.interval == 'year':
+            periods = max(0, now_dt.year - start.year)
+            unit = 'years'
+        else:
+            return None
+        nxt = start + relativedelta(**{unit: periods})
+        if nxt <= now_dt:
+            nxt = start + relativedelta(**{unit: periods + 1})
+        return nxt
+
+
+class ProcessedStripeEvent(models.Model):
+    """Événements webhook déjà traités (Stripe relivre en cas de non-2xx)."""
+    event_id = models.CharField(primary_key=True, max_length=255)
+    received_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.event_id
@@ -0,0 +1,35 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .decorators import invalidate_subscription_cache
+from .models import Plan, Subscription
+
+User = get_user_model()
+
+
+def sync_user_plan(user_id) -> None:
+    """
+    Recopie le plan de l'abonnement actif (le plus récent) sur
+    CustomUser.subscription, 'free' s'il n'y en a aucun. Le hot path de
+    subscription_required n'a ainsi plus besoin de lire la table Subscription.
+    """
+    plan = (
+        Subscription.objects
+        .filter(user_id=user_id, canceled_at__isnull=True)
+        .order_by("-start_date")
+        .values_list("product_name", flat=True)
+        .first()
+    ) or Plan.FREE
+    User.objects.filter(pk=user_id).exclude(subscription=plan).update(subscription=plan)
+    invalidate_subscription_cache(user_id)
+
+
+@receiver(post_save, sender=Subscription)
+def subscription_saved(sender, instance, **kwargs):
+    sync_user_plan(instance.user_id)
+
+
+@receiver(post_delete, sender=Subscription)
+def subscription_deleted(sender, instance, **kwargs):
+    sync_user_plan(instance.user_id)
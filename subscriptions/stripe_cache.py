@@ -0,0 +1,47 @@
+"""
+Cache des lectures Stripe, au-dessus de django.core.cache (Redis en prod).
+
+Les objets Stripe sont stockés en dict simple (le JSON brut de la réponse,
+expansions comprises) : mêmes accès obj["..."] / obj.get(...) côté vues. Le webhook invalide l'abonnement
+dès qu'il change côté Stripe.
+"""
+import stripe
+from django.core.cache import cache
+
+SUBSCRIPTION_TTL = 10 * 60
+SESSION_TTL = 60
+
+_SUBSCRIPTION_EXPAND = ["items.data.price.product", "default_payment_method"]
+# La session embarque l'abonnement déplié : _apply_subscription_from_session n'a rien à relire
+_SESSION_EXPAND = ["subscription.items.data.price.product"]
+
+
+def subscription_key(sub_id: str) -> str:
+    return f"stripe_sub:{sub_id}"
+
+
+def session_key(session_id: str) -> str:
+    return f"stripe_session:{session_id}"
+
+
+def retrieve_subscription(sub_id: str) -> dict:
+    """stripe.Subscription.retrieve (prix et produit dépliés), mémorisé SUBSCRIPTION_TTL."""
+    return cache.get_or_set(
+        subscription_key(sub_id),
+        lambda: stripe.Subscription.retrieve(sub_id, expand=_SUBSCRIPTION_EXPAND).last_response.data,
+        timeout=SUBSCRIPTION_TTL,
+    )
+
+
+def retrieve_checkout_session(session_id: str) -> dict:
+    """stripe.checkout.Session.retrieve (abonnement déplié), mémorisé SESSION_TTL (retours / rafraîchissements de la page succès)."""
+    return cache.get_or_set(
+        session_key(session_id),
+        lambda: stripe.checkout.Session.retrieve(session_id, expand=_SESSION_EXPAND).last_response.data,
+        timeout=SESSION_TTL,
+    )
+
+
+def invalidate_subscription(*sub_ids) -> None:
+    """À appeler après chaque écriture déclenchée par un événement Stripe."""
+    cache.delete_many([subscription_key(sid) for sid in sub_ids if sid])
@@ -0,0 +1,38 @@
+# subscriptions/tasks.py
+from celery import shared_task
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from . import stripe_cache
+from .models import ProcessedStripeEvent
+
+User = get_user_model()
+
+
+@shared_task(autoretry_for=(Exception,), retry_backoff=True, max_retries=3, acks_late=True)
+def apply_subscription_task(user_id: int, session_id: str):
+    """Active l'abonnement d'une session Checkout payée (redirection payment_success)."""
+    from .views import _apply_subscription_from_session  # import tardif : views importe ce module
+
+    user = User.objects.filter(pk=user_id).first()
+    if not user:
+        return "User not found"
+    _apply_subscription_from_session(user, stripe_cache.retrieve_checkout_session(session_id))
+    return "Applied"
+
+
+@shared_task(autoretry_for=(Exception,), retry_backoff=True, max_retries=5, acks_late=True)
+def dispatch_stripe_event_task(event: dict):
+    """
+    Traite un événement webhook vérifié. L'id est enregistré (ProcessedStripeEvent)
+    dans la même transaction que les écritures : si un handler échoue, tout est
+    annulé et la tâche réessaie ; une relivraison concurrente attend puis s'arrête.
+    """
+    from .views import _dispatch_event
+
+    with transaction.atomic():
+        _, created = ProcessedStripeEvent.objects.get_or_create(event_id=event["id"])
+        if not created:
+            return "Already processed"
+        _dispatch_event(event)
+    return event["type"]
@@ -1,3 +1,55 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+
+from accounts.models import _QUOTAS
+from .models import ProcessedStripeEvent, Subscription
+from .tasks import dispatch_stripe_event_task
+
+User = get_user_model()
+
+
+def _event(event_id, etype, obj):
+    return {"id": event_id, "type": etype, "data": {"object": obj}}
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class StripeWebhookTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("alice", "alice@example.com", "s3cret-pass!")
+        # post_save recopie le plan sur l'utilisateur
+        Subscription.objects.create(user=self.user, subscription_id="sub_1", product_name="pro")
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.subscription, "pro")
+
+    def test_duplicate_event_is_processed_once(self):
+        event = _event("evt_1", "invoice.payment_failed", {"subscription": "sub_1"})
+        with mock.patch("subscriptions.views._dispatch_event") as dispatch:
+            dispatch_stripe_event_task(event)
+            self.assertEqual(dispatch_stripe_event_task(event), "Already processed")
+        dispatch.assert_called_once_with(event)
+        self.assertEqual(ProcessedStripeEvent.objects.filter(event_id="evt_1").count(), 1)
+
+    def test_subscription_deleted_downgrades_user(self):
+        dispatch_stripe_event_task(_event("evt_2", "customer.subscription.deleted", {"id": "sub_1"}))
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.subscription, "free")
+        self.assertEqual(self.user.audio_credits_s, _QUOTAS["free"][0])
+        self.assertEqual(self.user.text_credits_ch, _QUOTAS["free"][1])
+        self.assertIsNotNone(Subscription.objects.get(subscription_id="sub_1").canceled_at)
+
+    def test_subscription_unpaid_downgrades_user(self):
+        dispatch_stripe_event_task(
+            _event("evt_3", "customer.subscription.updated", {"id": "sub_1", "status": "unpaid"})
+        )
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.subscription, "free")
+        self.assertIsNotNone(Subscription.objects.get(subscription_id="sub_1").canceled_at)
+
+    def test_subscription_active_update_keeps_plan(self):
+        dispatch_stripe_event_task(
+            _event("evt_4", "customer.subscription.updated", {"id": "sub_1", "status": "active"})
+        )
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.subscription, "pro")
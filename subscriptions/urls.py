@@ -1,14 +1,17 @@
 # subscriptions/urls.py
 from django.urls import path
-from . import views
+from .views import (
+    create_checkout_session_hosted, stripe_webhook, payment_success, payment_cancel,
+    check_status, my_sub_view, reset_credits_view,
+)
 
 urlpatterns = [
-    path("create-checkout-session-hosted/", views.create_checkout_session_hosted, name="create_checkout_session_hosted"),
-    path("webhook/", views.stripe_webhook, name="stripe_webhook"),
-    path("success/", views.payment_success, name="payment_success"),
-    path("cancel/", views.payment_cancel, name="payment_cancel"),
-    path("check-status/", views.check_status, name="subscription_check_status"),
-    path("my/", views.my_sub_view, name="my_sub"),
-    path("reset-credits/", views.reset_credits_view, name="reset_credits"),
+    path("create-checkout-session-hosted/", create_checkout_session_hosted, name="create_checkout_session_hosted"),
+    path("webhook/", stripe_webhook, name="stripe_webhook"),
+    path("success/", payment_success, name="payment_success"),
+    path("cancel/", payment_cancel, name="payment_cancel"),
+    path("check-status/", check_status, name="subscription_check_status"),
+    path("my/", my_sub_view, name="my_sub"),
+    path("reset-credits/", reset_credits_view, name="reset_credits"),
 
 ]
@@ -7,50 +7,96 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.utils import timezone
 from django.views.decorators.http import require_POST
+from django.views.decorators.cache import cache_control
+from django.views.decorators.vary import vary_on_cookie
 from django.db import transaction
+from django.db.models import Case, Count, IntegerField, Q, Value, When
+from django.db.models.functions import Now
 from django.contrib.auth import get_user_model
 from django.contrib.admin.views.decorators import staff_member_required
 
-import json
+from functools import lru_cache
+import logging
+import time
+from types import MappingProxyType
+import orjson
+import requests
 import stripe
+from requests.adapters import HTTPAdapter
 
-from .models import Subscription
-from .decorators import subscription_required
+from accounts.models import _QUOTAS
+from .models import Plan, ProcessedStripeEvent, Subscription
+from .decorators import invalidate_subscription_cache, subscription_required
+from .signals import sync_user_plan
+from . import stripe_cache
+from .tasks import apply_subscription_task, dispatch_stripe_event_task
+
+logger = logging.getLogger("subscriptions.webhook")
+User = get_user_model()  # résolu une fois (apps chargées à l'import des vues)
 
 stripe.api_key = settings.STRIPE_SECRET_KEY
+# Une session HTTP partagée pour tout le process : connexions TLS vers api.stripe.com réutilisées
+_stripe_session = requests.Session()
+_stripe_session.mount("https://", HTTPAdapter(pool_connections=20, pool_maxsize=50))
+stripe.default_http_client = stripe.RequestsClient(session=_stripe_session, timeout=10)
 # Stripe Prices -> plan
-SUBSCRIPTION_PRICES = {
+SUBSCRIPTION_PRICES = MappingProxyType({
     "student": "price_1RqU64LEbdBArTdnOEnKHVqR",
     "pro":     "price_1RqU6XLEbdBArTdnNB2vMF1O",
     "team":    "price_1RqU6yLEbdBArTdn9nP5Gzia",
-}
-PRICE_TO_PLAN = {v: k for k, v in SUBSCRIPTION_PRICES.items()}
+})
+PRICE_TO_PLAN = MappingProxyType({v: k for k, v in SUBSCRIPTION_PRICES.items()})
+CHECKOUT_IDEMPOTENCY_WINDOW = 600  # secondes : un double-clic renvoie la même session Stripe
+
+# Quotas (secondes audio, caractères texte) : table unique dans accounts.models
+_FREE_QUOTAS = _QUOTAS["free"]
+
+
+def _plan_quotas(plan: str) -> tuple:
+    return _QUOTAS.get(plan, _FREE_QUOTAS)
+
+
+def _quota_by_plan(i: int) -> Case:
+    # CASE SQL plan -> quota, pour les resets faits en un UPDATE
+    return Case(
+        *[When(subscription=plan, then=Value(q[i])) for plan, q in _QUOTAS.items()],
+        default=Value(_FREE_QUOTAS[i]),
+        output_field=IntegerField(),
+    )
 
-# Credits quota per plan (seconds)
-QUOTAS = {
-    "free":    3 * 3600,
-    "student": 10 * 3600,
-    "pro":     20 * 3600,
-    "team":    50 * 3600,
-}
+
+_AUDIO_QUOTA_BY_PLAN = _quota_by_plan(0)
+_TEXT_QUOTA_BY_PLAN = _quota_by_plan(1)
 
 # ---------- Core apply: switch active sub + mirror to user ----------
 def _activate_subscription(user, *, plan: str, sub_id: str, customer_id: str, price_eur: int, interval: str):
     """
-    Atomically:
+    Atomically, under a row lock on the user (webhook and payment_success may
+    run in parallel; needs a real transaction, i.e. not autocommit):
       - cancel any previous active sub for user (canceled_at = now)
       - create a new active Subscription row
       - mirror plan/credits on CustomUser with a DB-level update
+    Idempotent: if this Stripe subscription is already the active one
+    (page refresh, webhook retry), the existing row is returned untouched.
     """
-    User = get_user_model()
+    active = Subscription.objects.filter(user=user, subscription_id=sub_id, canceled_at__isnull=True).only("pk")
+    existing = active.first()
+    if existing:
+        return existing
+
     now = timezone.now()
 
     with transaction.atomic():
-        # lock & cancel previous
-        (Subscription.objects
-            .select_for_update()
-            .filter(user=user, canceled_at__isnull=True)
-            .update(canceled_at=now))
+        # lock the user row: a concurrent activation waits here instead of creating a second active sub
+        User.objects.select_for_update().filter(pk=user.pk).values_list("pk", flat=True).first()
+
+        # re-check under the lock: the concurrent call may have just activated it
+        existing = active.first()
+        if existing:
+            return existing
+
+        # cancel previous (.update() bypasses post_save: the user's plan is set by the mirror below)
+        Subscription.objects.filter(user=user, canceled_at__isnull=True).update(canceled_at=now)
 
         # create new active
         sub = Subscription.objects.create(
@@ -64,37 +110,57 @@ def _activate_subscription(user, *, plan: str, sub_id: str, customer_id: str, pr
         )
 
         # mirror to user
+        audio_s, text_ch = _plan_quotas(plan)
         User.objects.filter(pk=user.pk).update(
             subscription=plan,
-            credits=QUOTAS.get(plan, 0),
+            audio_credits_s=audio_s,
+            text_credits_ch=text_ch,
             last_audio_reset=now,
         )
+    invalidate_subscription_cache(user.pk)
 
     return sub
 
+# Chemins résolus une fois (le URLconf ne change pas à chaud)
+@lru_cache(maxsize=1)
+def _success_path() -> str:
+    return reverse("payment_success")
+
+@lru_cache(maxsize=1)
+def _cancel_path() -> str:
+    return reverse("payment_cancel")
+
+def _checkout_idempotency_key(flow: str, user_id, price_id: str) -> str:
+    # Fenêtre glissante : dédoublonne les doubles-clics sans bloquer un nouvel achat plus tard.
+    # `flow` distingue les vues : leurs paramètres Stripe diffèrent (metadata), une clé
+    # partagée ferait échouer la seconde en IdempotencyError.
+    return f"checkout:{flow}:{user_id}:{price_id}:{int(time.time() // CHECKOUT_IDEMPOTENCY_WINDOW)}"
+
 # ---------- Stripe success application ----------
 def _apply_subscription_from_session(user, session_dict: dict):
-    sub_id = session_dict.get("subscription")
+    subscription = session_dict.get("subscription")
     customer_id = session_dict.get("customer")
-    if not sub_id:
+    if not subscription:
         return
 
-    subscription = stripe.Subscription.retrieve(
-        sub_id,
-        expand=["items.data.price.product", "default_payment_method"]
-    )
+    if isinstance(subscription, str):
+        # Événement webhook : la session ne porte que l'id
+        sub_id = subscription
+        subscription = stripe_cache.retrieve_subscription(sub_id)
+    else:
+        # Session déjà dépliée (payment_success) : pas de second appel Stripe
+        sub_id = subscription["id"]
 
     item = subscription["items"]["data"][0]
     price = item["price"]
     product = price["product"]
 
     # Plan resolution: metadata.plan_key → fallback to configured price map → 'free'
-    plan = (product.get("metadata", {}) or {}).get("plan_key")
-    if not plan:
-        try:
-            plan = PRICE_TO_PLAN.get(price.get("id")) or "free"
-        except Exception:
-            plan = "free"
+    plan = (product.get("metadata") or {}).get("plan_key") or PRICE_TO_PLAN.get(price.get("id"), "free")
+    # La contrainte CHECK n'accepte que les valeurs de Plan
+    plan = str(plan).lower()
+    if plan not in Plan.values:
+        plan = Plan.FREE
     interval = (price.get("recurring") or {}).get("interval", "month")
     unit_amount = int(price.get("unit_amount", 0) / 100)
 
@@ -129,10 +195,11 @@ def subscription_view(request):
             mode="subscription",
             payment_method_types=["card"],
             line_items=[{"price": price_id, "quantity": 1}],
-            success_url=request.build_absolute_uri(reverse("payment_success")) + "?session_id={CHECKOUT_SESSION_ID}",
-            cancel_url=request.build_absolute_uri(reverse("payment_cancel")),
+            success_url=request.build_absolute_uri(_success_path()) + "?session_id={CHECKOUT_SESSION_ID}",
+            cancel_url=request.build_absolute_uri(_cancel_path()),
             customer_email=request.user.email,
             metadata={"user_id": str(request.user.id)},  # pour le webhook & success
+            idempotency_key=_checkout_idempotency_key("form", request.user.id, price_id),
         )
         return redirect(checkout_session.url, code=303)
     except stripe.error.StripeError as e:
@@ -145,9 +212,12 @@ def subscription_view(request):
 @login_required
 @subscription_required()
 def my_sub_view(request):
-    subs = Subscription.objects.filter(user=request.user).order_by("-start_date")
-    current = subs.filter(canceled_at__isnull=True).first()
-    return HttpResponse(f"Active: {bool(current)} / Total subs: {subs.count()}")  # minimal; adapte ton template si besoin
+    # Une seule requête : total + actifs par agrégation conditionnelle
+    agg = Subscription.objects.filter(user_id=request.user.id).aggregate(
+        total=Count("pk"),
+        active=Count("pk", filter=Q(canceled_at__isnull=True)),
+    )
+    return HttpResponse(f"Active: {bool(agg['active'])} / Total subs: {agg['total']}")  # minimal; adapte ton template si besoin
 
 # ---------- Webhook ----------
 @csrf_exempt
@@ -155,13 +225,37 @@ def stripe_webhook(request):
     payload = request.body
     sig_header = request.META.get("HTTP_STRIPE_SIGNATURE")
     try:
-        event = stripe.Webhook.construct_event(payload, sig_header, settings.STRIPE_WEBHOOK_SECRET)
+        # Vérification par le SDK, puis un seul parsing en dict simple (sérialisable pour Celery)
+        stripe.WebhookSignature.verify_header(
+            payload.decode("utf-8"), sig_header, settings.STRIPE_WEBHOOK_SECRET, stripe.Webhook.DEFAULT_TOLERANCE
+        )
+        event = orjson.loads(payload)
     except Exception as e:
-        print("[webhook] signature/parse error:", e)
+        logger.warning("signature/parse error: %s", e)
         return HttpResponse(status=400)
 
+    logger.info("received: %s", event["type"])
+
+    # Relivraison d'un événement déjà appliqué : acquittée sans rien rejouer
+    if ProcessedStripeEvent.objects.filter(event_id=event["id"]).exists():
+        logger.info("%s déjà traité", event["id"])
+        return HttpResponse(status=200)
+
+    # L'événement n'est marqué traité que par la tâche, dans la même transaction que
+    # ses écritures. Broker indisponible -> 500 : Stripe relivrera plus tard.
+    try:
+        dispatch_stripe_event_task.delay(event)
+    except Exception:
+        logger.exception("enqueue failed for %s", event["id"])
+        return HttpResponse(status=500)
+    return HttpResponse(status=200)
+
+def _dispatch_event(event: dict) -> None:
+    """
+    Applique un événement Stripe (appelé par dispatch_stripe_event_task, dans sa
+    transaction). Les erreurs remontent : la transaction est annulée et la tâche réessaie.
+    """
     etype = event["type"]
-    print(f"[webhook] received: {etype}")
 
     if etype == "checkout.session.completed":
         session = event["data"]["object"]
@@ -178,89 +272,96 @@ def stripe_webhook(request):
     elif etype == "invoice.payment_succeeded":
         invoice = event["data"]["object"]
         sub_id = invoice.get("subscription")
-        db_sub = Subscription.objects.filter(subscription_id=sub_id, canceled_at__isnull=True).first()
-        if db_sub:
-            user = db_sub.user
-            plan = (db_sub.product_name or "free").lower()
-            User = get_user_model()
-            User.objects.filter(pk=user.pk).update(
-                credits=QUOTAS.get(plan, 0),
-                last_audio_reset=timezone.now(),
-            )
-            print(f"[webhook] reset mensuel des crédits pour {user.username} ({plan})")
+        # Un seul UPDATE : utilisateurs joints à l'abonnement actif, quota choisi par CASE sur le plan
+        updated = User.objects.filter(
+            subscriptions__subscription_id=sub_id,
+            subscriptions__canceled_at__isnull=True,
+        ).update(
+            audio_credits_s=_AUDIO_QUOTA_BY_PLAN,
+            text_credits_ch=_TEXT_QUOTA_BY_PLAN,
+            last_audio_reset=Now(),
+        )
+        if updated:
+            logger.info("reset mensuel des crédits pour l'abonnement %s", sub_id)
+        stripe_cache.invalidate_subscription(sub_id)
     elif etype == "invoice.payment_failed":
         invoice = event["data"]["object"]
         sub_id = invoice.get("subscription")
-        Subscription.objects.filter(subscription_id=sub_id).update(status="past_due")
+        # Pas de colonne de statut sur Subscription : l'accès est coupé par
+        # customer.subscription.updated (unpaid) / deleted. On ne garde ici que le cache.
+        stripe_cache.invalidate_subscription(sub_id)
+        logger.info("paiement échoué pour l'abonnement %s", sub_id)
         # Optional: notify user / throttle features
 
-    return HttpResponse(status=200)
-
 # ---------- Handlers appelés par le webhook ----------
 def _handle_checkout_session_completed(session_dict: dict) -> None:
-    try:
-        metadata = session_dict.get("metadata") or {}
-        user_id = metadata.get("user_id") or session_dict.get("client_reference_id")
-        if not user_id:
-            print("[webhook] no user_id in session metadata/client_reference_id")
-            return
-        User = get_user_model()
-        user = User.objects.filter(pk=user_id).first()
-        if not user:
-            print(f"[webhook] checkout.completed: user {user_id} introuvable")
-            return
-        _apply_subscription_from_session(user, session_dict)
-    except Exception as e:
-        print(f"[webhook] error in _handle_checkout_session_completed: {e}")
+    metadata = session_dict.get("metadata") or {}
+    user_id = metadata.get("user_id") or session_dict.get("client_reference_id")
+    if not user_id:
+        logger.warning("no user_id in session metadata/client_reference_id")
+        return
+    user = User.objects.filter(pk=user_id).first()
+    if not user:
+        logger.warning("checkout.completed: user %s introuvable", user_id)
+        return
+    _apply_subscription_from_session(user, session_dict)
 
 def _handle_subscription_updated(sub_obj):
     sub_id = sub_obj.get("id")
-    fields = {
-        "status": sub_obj.get("status"),
-        "cancel_at_period_end": sub_obj.get("cancel_at_period_end", False),
-        "current_period_start": sub_obj.get("current_period_start"),
-        "current_period_end": sub_obj.get("current_period_end"),
-        "canceled_at": timezone.now() if sub_obj.get("status") in ("canceled", "unpaid") else None,
-    }
-    Subscription.objects.filter(subscription_id=sub_id).update(**{k:v for k,v in fields.items() if v is not None})
-
-def _handle_subscription_deleted(sub_obj):
-    try:
-        sub_id = sub_obj.get("id")
-        if not sub_id:
-            print("[webhook] deleted: missing sub id")
+    stripe_cache.invalidate_subscription(sub_id)
+    with transaction.atomic():
+        # Ligne verrouillée, lue sans instance ; si checkout.session.completed n'est pas
+        # encore passé, il relira l'abonnement à jour chez Stripe (cache invalidé ci-dessus)
+        row = (Subscription.objects
+               .select_for_update()
+               .filter(subscription_id=sub_id)
+               .values("pk", "user_id")
+               .first())
+        if not row:
+            logger.info("updated: sub %s pas encore en DB", sub_id)
             return
+        # Le modèle ne stocke pas le statut Stripe détaillé : seul canceled_at est reporté
+        if sub_obj.get("status") in ("canceled", "unpaid"):
+            Subscription.objects.filter(pk=row["pk"], canceled_at__isnull=True).update(canceled_at=timezone.now())
+        # .update() ne déclenche pas post_save : plan de l'utilisateur recalculé ici
+        # (repasse en 'free' s'il ne reste aucun abonnement actif) + cache invalidé
+        sync_user_plan(row["user_id"])
 
-        db_sub = Subscription.objects.filter(subscription_id=sub_id, canceled_at__isnull=True).first()
-        if not db_sub:
-            db_sub = Subscription.objects.filter(subscription_id=sub_id).first()
+def _handle_subscription_deleted(sub_obj):
+    sub_id = sub_obj.get("id")
+    if not sub_id:
+        logger.warning("deleted: missing sub id")
+        return
 
-        if not db_sub:
-            print(f"[webhook] deleted: sub {sub_id} introuvable en DB → vérifie l’enregistrement au checkout")
+    now = timezone.now()
+    with transaction.atomic():
+        # UPDATE ... WHERE canceled_at IS NULL : pas de SELECT + save(), pas de course entre deux suppressions
+        active = Subscription.objects.filter(subscription_id=sub_id, canceled_at__isnull=True)
+        user_ids = list(active.select_for_update().values_list("user_id", flat=True))
+        if not user_ids:
+            logger.info("deleted: sub %s absente ou déjà annulée en DB", sub_id)
             return
+        active.update(canceled_at=now)
 
-        if not db_sub.canceled_at:
-            now = timezone.now()
-            db_sub.canceled_at = now
-            db_sub.save(update_fields=["canceled_at"])
-
-        User = get_user_model()
-        User.objects.filter(pk=db_sub.user_id).update(
-            subscription="free",
-            credits=QUOTAS.get("free", 0),
-            last_audio_reset=timezone.now(),
+        User.objects.filter(pk__in=user_ids).update(
+            audio_credits_s=_FREE_QUOTAS[0],
+            text_credits_ch=_FREE_QUOTAS[1],
+            last_audio_reset=now,
         )
-        print(f"[webhook] subscription {sub_id} DELETED → canceled_at set, user downgraded")
-    except Exception as e:
-        print(f"[webhook] error in _handle_subscription_deleted: {e}")
+        # .update() ne déclenche pas post_save : plan recalculé depuis les abonnements
+        # encore actifs ('free' s'il n'y en a plus), cache invalidé au passage
+        for user_id in user_ids:
+            sync_user_plan(user_id)
+    stripe_cache.invalidate_subscription(sub_id)
+    logger.info("subscription %s DELETED → canceled_at set, user downgraded", sub_id)
 
 # ---------- API: Checkout session depuis un bouton JS ----------
 @login_required
 @require_POST
 def create_checkout_session_hosted(request):
     try:
-        data = json.loads(request.body.decode("utf-8"))
-    except Exception:
+        data = orjson.loads(request.body)  # bytes directement, pas de decode()
+    except orjson.JSONDecodeError:
         return JsonResponse({"error": "Invalid JSON"}, status=400)
 
     plan = (data.get("plan") or "").lower().strip()
@@ -273,10 +374,11 @@ def create_checkout_session_hosted(request):
             mode="subscription",
             payment_method_types=["card"],
             line_items=[{"price": price_id, "quantity": 1}],
-            success_url=request.build_absolute_uri(reverse("payment_success")) + "?session_id={CHECKOUT_SESSION_ID}",
-            cancel_url=request.build_absolute_uri(reverse("payment_cancel")),
+            success_url=request.build_absolute_uri(_success_path()) + "?session_id={CHECKOUT_SESSION_ID}",
+            cancel_url=request.build_absolute_uri(_cancel_path()),
             customer_email=request.user.email,
             metadata={"user_id": str(request.user.id), "plan": plan},
+            idempotency_key=_checkout_idempotency_key("hosted", request.user.id, price_id),
         )
         return JsonResponse({"url": session.url}, status=200)
     except stripe.error.StripeError as e:
@@ -285,16 +387,22 @@ def create_checkout_session_hosted(request):
         return JsonResponse({"error": f"Unexpected error: {e}"}, status=500)
 
 @login_required
+@cache_control(max_age=10, private=True)
+@vary_on_cookie
 def check_status(request):
-    return JsonResponse({"subscription": getattr(request.user, "subscription", "free")})
+    # Route interrogée en boucle par le front : cache navigateur 10 s, sérialisation orjson
+    return HttpResponse(
+        orjson.dumps({"subscription": getattr(request.user, "subscription", "free")}),
+        content_type="application/json",
+    )
 
 @staff_member_required
 def reset_credits_view(request):
     user = request.user
-    plan = getattr(user, "subscription", "free")
-    User = get_user_model()
+    audio_s, text_ch = _plan_quotas(getattr(user, "subscription", "free"))
     User.objects.filter(pk=user.pk).update(
-        credits=QUOTAS.get(plan, 0),
+        audio_credits_s=audio_s,
+        text_credits_ch=text_ch,
         last_audio_reset=timezone.now(),
     )
     return HttpResponse("Credits reset OK")
@@ -308,10 +416,11 @@ def payment_success(request):
         return redirect("account_page")
 
     try:
-        session = stripe.checkout.Session.retrieve(session_id)
+        session = stripe_cache.retrieve_checkout_session(session_id)
         if session.get("payment_status") == "paid":
-            _apply_subscription_from_session(request.user, session)
-            messages.success(request, "Votre abonnement a été activé 🎉")
+            # Retrieve + activation en tâche de fond : la redirection n'attend pas Stripe
+            apply_subscription_task.delay(request.user.id, session_id)
+            messages.success(request, "Votre abonnement est en cours d'activation 🎉")
             return redirect("account_page")
         else:
             messages.error(request, "Le paiement n'a pas été confirmé.")